@@ -1,23 +1,37 @@
 import sys
 import datetime
 from src.utils.config import load_app_config
-from src.auth.token_service import TokenManager
+from src.auth.accounts import AccountRegistry, prompt_account, manage_groups_flow
 from src.auth.oauth import new_authorization
 from src.data_query.data_query import run_query_flow
 # [新增] 导入历史记录模块
 from src.data_query.history import view_history_flow
+from src.data_query.backfill import backfill_flow
+from src.data_query.batch import batch_query_flow
+from src.data_query.readiness import readiness_flow, run_when_ready, resolve_group
+from src.service.client import daemon_client
+from src.share.feishu_mirror import mirror_flow
+from src.share.columnar import export_flow
 
 def format_ts(ts: int) -> str:
     """将时间戳转换为可读字符串"""
     return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
 
 def view_accounts_detail():
-    """详细展示所有账户的授权状态（含过期时间）"""
-    tokens = TokenManager.get_tokens()
-    if not tokens:
+    """详细展示账户的授权状态（含过期时间），支持按分组 / 关键词筛选"""
+    registry = AccountRegistry.load()
+    if not len(registry):
         print("\n⚠️ 暂无已授权的聚光账户")
         return
 
+    keyword = input(f"\n共 {len(registry)} 个账户，输入分组名或关键词筛选 (回车显示全部): ").strip()
+    if not keyword:
+        tokens = registry.accounts
+    elif keyword in registry.groups():
+        tokens = registry.group_members(keyword)
+    else:
+        tokens = registry.search(keyword, limit=len(registry))
+
     print("\n" + "="*100)
     print(f"{'序号':<5} {'账户名称':<25} {'账户ID':<15} {'Access过期时间':<20} {'Refresh过期时间'}")
     print("-" * 100)
@@ -30,26 +44,8 @@ def view_accounts_detail():
     input("\n按回车键返回主菜单...")
 
 def select_account():
-    """简略展示账户供选择"""
-    tokens = TokenManager.get_tokens()
-    if not tokens:
-        print("⚠️ 暂无授权账户，请先选择功能 2 进行添加。")
-        return None
-    
-    print("\n请选择要查询的账户：")
-    print("-" * 40)
-    for i, t in enumerate(tokens, 1):
-        print(f"{i}. {t['advertiser_name']} (ID: {t['advertiser_id']})")
-    print("-" * 40)
-    
-    choice = input("请输入序号 (0 返回): ").strip()
-    if not choice.isdigit() or int(choice) == 0:
-        return None
-    
-    idx = int(choice) - 1
-    if 0 <= idx < len(tokens):
-        return tokens[idx]
-    return None
+    """选择单个账户 (账户较多时按 ID / 名称检索)"""
+    return prompt_account()
 
 def main():
     try:
@@ -59,14 +55,37 @@ def main():
         input("按回车退出...")
         sys.exit(1)
 
+    # 命令行模式：python main.py --daemon 启动本地查询服务
+    args = sys.argv[1:]
+    if '--daemon' in args:
+        from src.service.daemon import serve
+        serve()
+        return
+
+    # 命令行模式：python main.py --wait-ready [--group 分组名] [--no-sync]
+    # 适合配置为每日早上的定时任务，昨日数据一产出即自动拉取并同步飞书
+    if '--wait-ready' in args:
+        group = args[args.index('--group') + 1] if '--group' in args[:-1] else None
+        ok = run_when_ready(resolve_group(group), sync='--no-sync' not in args)
+        sys.exit(0 if ok else 1)
+
     while True:
         print("\n" + "="*40)
         print(" RedAd DataQuery v2.2 (Token托管版)")
+        if daemon_client.is_available():
+            print(" 🛰️ 已连接本地查询服务")
         print("="*40)
         print("1. 数据查询 (自动刷新Token)")
         print("2. 新增/重新授权账户")
         print("3. 查看已授权账户状态")
         print("4. 查询历史记录 (打开/导出)") # [新增选项]
+        print("5. 历史数据回填 (按天/断点续传)")
+        print("6. 启动本地查询服务 (供多个窗口共享)")
+        print("7. 飞书数据对账 (镜像全部数据表)")
+        print("8. 账户分组管理")
+        print("9. 批量查询 (按分组/检索)")
+        print("10. 等待昨日数据产出后自动拉取")
+        print("11. 导出分析数据 (Arrow / Parquet)")
         print("q. 退出程序")
         
         cmd = input("请输入指令: ").strip().lower()
@@ -85,6 +104,28 @@ def main():
         elif cmd == '4':
             # [新增调用]
             view_history_flow()
+
+        elif cmd == '5':
+            backfill_flow()
+
+        elif cmd == '6':
+            from src.service.daemon import serve
+            serve()
+
+        elif cmd == '7':
+            mirror_flow()
+
+        elif cmd == '8':
+            manage_groups_flow()
+
+        elif cmd == '9':
+            batch_query_flow()
+
+        elif cmd == '10':
+            readiness_flow()
+
+        elif cmd == '11':
+            export_flow()
             
         elif cmd == 'q':
             print("感谢使用，再见！")
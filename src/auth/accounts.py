@@ -0,0 +1,316 @@
+import os
+import bisect
+import threading
+from typing import Dict, List, Optional
+from src.auth.token_service import TokenManager
+from src.utils.config import TOKEN_CONFIG_PATH, ACCOUNT_GROUPS_PATH
+from src.utils.storage import read_json, update_json, CorruptFileError
+from src.service.client import daemon_client
+
+# 分组类型 (仅用于展示与筛选，可自由填写其他类型)
+GROUP_CATEGORIES = ("client", "region", "team")
+
+
+def _grams(text: str) -> set:
+    """单字 + 双字切片，用于子串检索 (中文名称无空格分词，按字切片最稳妥)"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class AccountRegistry:
+    """
+    已授权账户的内存索引：
+    - 账户ID 精确/前缀查找 (dict + 有序列表二分)
+    - 名称前缀查找 (有序列表二分)
+    - 名称子串查找 (单字/双字倒排索引取最小候选集后校验)
+    本地查询服务运行时账户列表取自服务端，否则读取本地 token_config.json；
+    账户列表未变化时复用同一份索引，避免反复读文件与重建。
+    """
+
+    _cached = None
+    # 缓存来源标记：("daemon",) 或 ("file", token_config.json 的 mtime)
+    _cached_key = None
+    _lock = threading.Lock()
+
+    def __init__(self, tokens: list):
+        self.accounts = tokens
+        self._by_id = {str(t['advertiser_id']): t for t in tokens}
+        self._ids = sorted(self._by_id)
+        self._names = sorted((t['advertiser_name'].lower(), str(t['advertiser_id'])) for t in tokens)
+        self._gram_index = {}
+        for t in tokens:
+            for g in _grams(t['advertiser_name'].lower()):
+                self._gram_index.setdefault(g, set()).add(str(t['advertiser_id']))
+
+    @classmethod
+    def load(cls) -> "AccountRegistry":
+        if daemon_client.is_available():
+            try:
+                tokens = daemon_client.list_accounts()
+            except Exception as e:
+                print(f"⚠️ 无法从本地查询服务获取账户列表，改为读取本地配置: {e}")
+            else:
+                with cls._lock:
+                    if cls._cached_key != ("daemon",) or cls._cached.accounts != tokens:
+                        cls._cached = cls(tokens)
+                        cls._cached_key = ("daemon",)
+                    return cls._cached
+
+        try:
+            key = ("file", os.stat(TOKEN_CONFIG_PATH).st_mtime_ns)
+        except OSError:
+            key = ("file", None)
+        with cls._lock:
+            if cls._cached is None or key != cls._cached_key:
+                cls._cached = cls(TokenManager.get_tokens())
+                cls._cached_key = key
+            return cls._cached
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def get(self, advertiser_id) -> Optional[Dict]:
+        return self._by_id.get(str(advertiser_id))
+
+    @staticmethod
+    def _prefix_range(sorted_list: list, prefix: str, key=lambda x: x) -> list:
+        """有序列表中以 prefix 开头的连续区间 (二分定位起点)"""
+        i = bisect.bisect_left(sorted_list, prefix, key=key)
+        result = []
+        while i < len(sorted_list) and key(sorted_list[i]).startswith(prefix):
+            result.append(sorted_list[i])
+            i += 1
+        return result
+
+    def search(self, query: str, limit: int = 50) -> List[Dict]:
+        """按 账户ID / 名称前缀 / 名称子串 检索，结果按匹配程度排序"""
+        q = query.strip().lower()
+        if not q:
+            return []
+
+        ordered = []
+        seen = set()
+
+        def add(adv_id):
+            if adv_id not in seen:
+                seen.add(adv_id)
+                ordered.append(self._by_id[adv_id])
+
+        if q in self._by_id:
+            add(q)
+        if q.isdigit():
+            for adv_id in self._prefix_range(self._ids, q):
+                add(adv_id)
+        for _, adv_id in self._prefix_range(self._names, q, key=lambda x: x[0]):
+            add(adv_id)
+
+        # 子串：取查询串中候选集最小的切片做过滤，再逐个校验
+        grams = [g for g in _grams(q) if len(g) == min(2, len(q))]
+        candidates = None
+        for g in grams:
+            ids = self._gram_index.get(g, set())
+            candidates = ids if candidates is None or len(ids) < len(candidates) else candidates
+        for adv_id in sorted(candidates or ()):
+            if q in self._by_id[adv_id]['advertiser_name'].lower():
+                add(adv_id)
+
+        return ordered[:limit]
+
+    # ---------------- 分组 ----------------
+
+    @staticmethod
+    def groups() -> Dict[str, Dict]:
+        """{分组名: {"category": 类型, "members": [账户ID, ...]}}"""
+        return read_json(ACCOUNT_GROUPS_PATH, {}).get("groups", {})
+
+    def group_members(self, group_name: str) -> List[Dict]:
+        """分组内仍处于授权状态的账户"""
+        group = self.groups().get(group_name)
+        if not group:
+            return []
+        return [self._by_id[i] for i in group.get("members", []) if i in self._by_id]
+
+    @staticmethod
+    def save_group(group_name: str, category: str = "", add: list = (), remove: list = ()):
+        """新建或修改分组 (成员增删)，加锁读-改-写"""
+        def mutate(data: dict):
+            groups = data.setdefault("groups", {})
+            group = groups.setdefault(group_name, {"category": category, "members": []})
+            if category:
+                group["category"] = category
+            members = [m for m in group["members"] if m not in {str(r) for r in remove}]
+            for m in add:
+                if str(m) not in members:
+                    members.append(str(m))
+            group["members"] = members
+
+        update_json(ACCOUNT_GROUPS_PATH, mutate)
+
+    @staticmethod
+    def delete_group(group_name: str):
+        def mutate(data: dict):
+            data.get("groups", {}).pop(group_name, None)
+
+        update_json(ACCOUNT_GROUPS_PATH, mutate)
+
+
+# ---------------- 交互选择 ----------------
+
+# 账户数不超过该值时直接列出全部账户，否则先搜索
+LIST_ALL_LIMIT = 20
+
+
+def _print_accounts(accounts: list):
+    print("-" * 40)
+    for i, t in enumerate(accounts, 1):
+        print(f"{i}. {t['advertiser_name']} (ID: {t['advertiser_id']})")
+    print("-" * 40)
+
+
+def _pick_many(accounts: list, prompt: str) -> list:
+    """按 "1,3,5" 或 a (全部) 从列表中多选"""
+    choice = input(prompt).strip().lower()
+    if choice == 'a':
+        return list(accounts)
+    idxs = [int(x) - 1 for x in choice.replace('，', ',').split(',') if x.strip().isdigit()]
+    return [accounts[i] for i in idxs if 0 <= i < len(accounts)]
+
+
+def prompt_account() -> Optional[Dict]:
+    """交互选择单个账户：账户较少时直接列出，较多时按 ID / 名称检索"""
+    registry = AccountRegistry.load()
+    if not len(registry):
+        print("⚠️ 暂无授权账户，请先选择功能 2 进行添加。")
+        return None
+
+    candidates = registry.accounts
+    while True:
+        if len(candidates) <= LIST_ALL_LIMIT:
+            print("\n请选择要查询的账户：")
+            _print_accounts(candidates)
+            choice = input("请输入序号，或输入账户ID/名称关键词搜索 (0 返回): ").strip()
+        else:
+            choice = input(f"\n共 {len(candidates)} 个账户，请输入账户ID/名称关键词搜索 (0 返回): ").strip()
+
+        if not choice or choice == '0':
+            return None
+        if choice.isdigit() and len(candidates) <= LIST_ALL_LIMIT and 0 < int(choice) <= len(candidates):
+            return candidates[int(choice) - 1]
+
+        results = registry.search(choice)
+        if not results:
+            print("❌ 未找到匹配的账户")
+            candidates = registry.accounts
+        elif len(results) == 1:
+            return results[0]
+        else:
+            candidates = results
+
+
+def prompt_accounts() -> list:
+    """交互选择一批账户：全部 / 按分组 / 检索后多选"""
+    registry = AccountRegistry.load()
+    if not len(registry):
+        print("⚠️ 暂无授权账户，请先进行授权。")
+        return []
+
+    groups = registry.groups()
+    print(f"\n请选择目标账户 (共 {len(registry)} 个已授权账户)：")
+    print("  a  全部账户")
+    for name, g in groups.items():
+        print(f"  {name}  [{g.get('category') or '-'}] 分组，{len(registry.group_members(name))} 个账户")
+    choice = input("请输入 a / 分组名 / 账户ID或名称关键词 (0 返回): ").strip()
+
+    if not choice or choice == '0':
+        return []
+    if choice.lower() == 'a':
+        return list(registry.accounts)
+    if choice in groups:
+        members = registry.group_members(choice)
+        if not members:
+            print("⚠️ 该分组内没有已授权的账户")
+        return members
+
+    results = registry.search(choice)
+    if not results:
+        print("❌ 未找到匹配的账户")
+        return []
+    _print_accounts(results)
+    return _pick_many(results, "请输入序号，多个用逗号分隔 (a 全部结果): ")
+
+
+def manage_groups_flow():
+    """账户分组管理"""
+    while True:
+        registry = AccountRegistry.load()
+        groups = registry.groups()
+        print("\n" + "=" * 60)
+        print(f"{'分组名称':<20} {'类型':<10} {'账户数'}")
+        print("-" * 60)
+        for name, g in groups.items():
+            print(f"{name:<20} {g.get('category') or '-':<10} {len(g.get('members', []))}")
+        if not groups:
+            print("暂无分组")
+        print("=" * 60)
+        print("1. 新建分组 / 添加成员")
+        print("2. 移除分组成员")
+        print("3. 查看分组成员")
+        print("4. 删除分组")
+        print("0. 返回上一级")
+        action = input("请选择操作: ").strip()
+
+        if action == '0':
+            return
+        if action not in ('1', '2', '3', '4'):
+            print("❌ 无效输入")
+            continue
+
+        name = input("分组名称: ").strip()
+        if not name:
+            continue
+
+        if action == '1':
+            category = ""
+            if name not in groups:
+                category = input(f"分组类型 ({' / '.join(GROUP_CATEGORIES)}，可自定义): ").strip()
+            keyword = input("输入账户ID/名称关键词搜索要加入的账户: ").strip()
+            results = registry.search(keyword)
+            if not results:
+                print("❌ 未找到匹配的账户")
+                continue
+            _print_accounts(results)
+            picked = _pick_many(results, "请输入序号，多个用逗号分隔 (a 全部结果): ")
+            try:
+                AccountRegistry.save_group(name, category, add=[t['advertiser_id'] for t in picked])
+            except CorruptFileError as e:
+                print(f"❌ 分组保存失败: {e}")
+                continue
+            print(f"✅ 已向分组 [{name}] 添加 {len(picked)} 个账户")
+
+        elif name not in groups:
+            print("❌ 分组不存在")
+
+        elif action == '2':
+            members = registry.group_members(name)
+            _print_accounts(members)
+            picked = _pick_many(members, "请输入要移除的序号，多个用逗号分隔: ")
+            try:
+                AccountRegistry.save_group(name, remove=[t['advertiser_id'] for t in picked])
+            except CorruptFileError as e:
+                print(f"❌ 分组保存失败: {e}")
+                continue
+            print(f"✅ 已从分组 [{name}] 移除 {len(picked)} 个账户")
+
+        elif action == '3':
+            _print_accounts(registry.group_members(name))
+            input("\n按回车键返回...")
+
+        elif action == '4':
+            if input(f"确认删除分组 [{name}]? (y/n): ").strip().lower() == 'y':
+                try:
+                    AccountRegistry.delete_group(name)
+                except CorruptFileError as e:
+                    print(f"❌ 分组删除失败: {e}")
+                    continue
+                print("✅ 分组已删除")
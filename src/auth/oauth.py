@@ -4,6 +4,7 @@ import webbrowser
 from urllib.parse import urlparse, parse_qs
 from src.utils.config import load_app_config, BASE_DIR, load_json
 from src.auth.token_service import TokenManager
+from src.utils.storage import CorruptFileError
 
 def new_authorization():
     """执行全新的授权流程"""
@@ -59,5 +60,9 @@ def new_authorization():
             'access_expires_at': int(now + data['access_token_expires_in']),
             'refresh_expires_at': int(now + data['refresh_token_expires_in'])
         }
-        TokenManager.add_or_update_token(account_data)
+        try:
+            TokenManager.add_or_update_token(account_data)
+        except CorruptFileError as e:
+            print(f"❌ 授权保存失败: {e}")
+            return
         print(f"✅ 账户 [{advertiser['advertiser_name']}] 授权保存成功！")
\ No newline at end of file
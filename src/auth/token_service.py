@@ -1,7 +1,9 @@
 import time
-import requests
+import asyncio
 from typing import Dict, Optional
-from src.utils.config import TOKEN_CONFIG_PATH, load_json, save_json, load_app_config
+from src.utils.config import TOKEN_CONFIG_PATH, load_json, load_app_config
+from src.utils.storage import file_lock, update_json
+from src.utils.aio import get_session, run_sync
 
 class LoginRequiredError(Exception):
     """自定义异常：Refresh Token 也过期了，必须重新扫码"""
@@ -13,22 +15,29 @@ class TokenManager:
         return load_json(TOKEN_CONFIG_PATH)
 
     @staticmethod
-    def _save_tokens(tokens: list):
-        save_json(TOKEN_CONFIG_PATH, tokens)
+    def _update_account(account: Dict):
+        """加锁读-改-写：只替换/追加该账户，不覆盖其他进程刚写入的账户数据"""
+        def mutate(tokens: list):
+            for i, t in enumerate(tokens):
+                if str(t['advertiser_id']) == str(account['advertiser_id']):
+                    tokens[i] = account
+                    return
+            tokens.append(account)
+
+        update_json(TOKEN_CONFIG_PATH, mutate, default=list)
 
     @classmethod
-    def get_valid_token(cls, advertiser_id: str) -> str:
-        """
-        核心方法：获取有效的 Access Token。
-        如果 Access 过期但 Refresh 有效，自动刷新并保存。
-        如果都过期，抛出 LoginRequiredError。
-        """
+    def _find_account(cls, advertiser_id: str) -> Dict:
         tokens = cls.get_tokens()
         account = next((t for t in tokens if str(t['advertiser_id']) == str(advertiser_id)), None)
 
         if not account:
             raise ValueError(f"未找到账户 ID: {advertiser_id}")
+        return account
 
+    @staticmethod
+    def _usable_token(account: Dict) -> Optional[str]:
+        """Access 有效返回 Token；需要刷新返回 None；都过期抛出 LoginRequiredError"""
         now = time.time()
         # 缓冲 300 秒，提前刷新
         if now < account['access_expires_at'] - 300:
@@ -37,56 +46,77 @@ class TokenManager:
         # Access Token 过期，检查 Refresh Token
         if now < account['refresh_expires_at'] - 300:
             print(f"🔄 账户 [{account['advertiser_name']}] Token 已过期，正在自动刷新...")
-            return cls._perform_refresh(account)
+            return None
         
         # 都过期了
         raise LoginRequiredError(f"账户 [{account['advertiser_name']}] 授权已完全失效，请重新授权。")
 
     @classmethod
-    def _perform_refresh(cls, account: Dict) -> str:
+    def get_valid_token(cls, advertiser_id: str) -> str:
+        """
+        核心方法：获取有效的 Access Token。
+        如果 Access 过期但 Refresh 有效，自动刷新并保存。
+        如果都过期，抛出 LoginRequiredError。
+        """
+        account = cls._find_account(advertiser_id)
+        return cls._usable_token(account) or cls._perform_refresh(account)
+
+    @classmethod
+    async def get_valid_token_async(cls, advertiser_id: str) -> str:
+        """get_valid_token 的异步版本：文件读写与跨进程加锁放到线程中执行，不阻塞事件循环"""
+        account = await asyncio.to_thread(cls._find_account, advertiser_id)
+        return cls._usable_token(account) or await asyncio.to_thread(cls._perform_refresh, account)
+
+    @staticmethod
+    async def _refresh_request_async(refresh_token: str) -> Dict:
+        """调用刷新接口，返回新的 Token 数据"""
         app_config = load_app_config()
         url = "https://adapi.xiaohongshu.com/api/open/oauth2/refresh_token"
         payload = {
             "app_id": app_config['APP_ID'],
             "secret": app_config['SECRET'],
-            "refresh_token": account['refresh_token']
+            "refresh_token": refresh_token
         }
-        
-        resp = requests.post(url, json=payload, headers={"Content-Type": "application/json"})
-        data = resp.json()
+
+        session = await get_session()
+        async with session.post(url, json=payload, headers={"Content-Type": "application/json"}) as resp:
+            data = await resp.json(content_type=None)
 
         if data.get('code') != 0:
             raise Exception(f"刷新失败: {data.get('msg')}")
+        return data['data']
+
+    @classmethod
+    def _perform_refresh(cls, account: Dict) -> str:
+        # 刷新期间持有 token_config 文件锁：Refresh Token 刷新后旧值即失效，
+        # 多个进程/线程同时刷新同一账户会导致后到者失败，因此必须串行
+        with file_lock(TOKEN_CONFIG_PATH):
+            latest = next((t for t in cls.get_tokens()
+                           if str(t['advertiser_id']) == str(account['advertiser_id'])), None)
+            if latest and time.time() < latest['access_expires_at'] - 300:
+                # 等锁期间其他进程已完成刷新，直接复用
+                return latest['access_token']
+            if latest:
+                account = latest
+
+            new_data = run_sync(cls._refresh_request_async(account['refresh_token']))
+
+            # 更新内存中的数据
+            current_time = time.time()
+
+            account['access_token'] = new_data['access_token']
+            account['refresh_token'] = new_data['refresh_token']
+            account['access_expires_at'] = int(current_time + new_data['access_token_expires_in'])
+            account['refresh_expires_at'] = int(current_time + new_data['refresh_token_expires_in'])
+
+            # 更新文件
+            cls._update_account(account)
 
-        # 更新内存中的数据
-        new_data = data['data']
-        current_time = time.time()
-        
-        account['access_token'] = new_data['access_token']
-        account['refresh_token'] = new_data['refresh_token']
-        account['access_expires_at'] = int(current_time + new_data['access_token_expires_in'])
-        account['refresh_expires_at'] = int(current_time + new_data['refresh_token_expires_in'])
-
-        # 更新文件
-        all_tokens = cls.get_tokens()
-        for i, t in enumerate(all_tokens):
-            if str(t['advertiser_id']) == str(account['advertiser_id']):
-                all_tokens[i] = account
-                break
-        cls._save_tokens(all_tokens)
-        
         print("✅ Token 自动刷新成功！")
         return account['access_token']
 
     @classmethod
     def add_or_update_token(cls, new_account_data: Dict):
         """供 oauth.py 调用，用于保存新授权的账户"""
-        tokens = cls.get_tokens()
         # 检查是否存在，存在则更新，不存在则追加
-        for i, t in enumerate(tokens):
-            if str(t['advertiser_id']) == str(new_account_data['advertiser_id']):
-                tokens[i] = new_account_data
-                cls._save_tokens(tokens)
-                return
-        tokens.append(new_account_data)
-        cls._save_tokens(tokens)
\ No newline at end of file
+        cls._update_account(new_account_data)
@@ -0,0 +1,126 @@
+import os
+import json
+import zlib
+import datetime
+from pathlib import Path
+from src.share.exporter import parse_filename
+from src.utils.config import DATA_DOWNLOAD_DIR
+from src.utils.storage import file_lock, read_json, write_json_atomic
+
+# ========================================================
+# 历史记录归档
+# 逻辑：将较早的单次查询 JSON 按查询月份归档为压缩分段文件 (YYYY-MM.seg)，
+#      每条记录单独 zlib 压缩后顺序追加，偏移量/长度写入索引 (YYYY-MM.idx)；
+#      读取单条记录只需 seek + 解压该条，无需解包整个归档。
+# ========================================================
+
+ARCHIVE_DIR = DATA_DOWNLOAD_DIR / 'archive'
+
+# 默认归档早于 N 天的查询记录，近期记录保持为散文件便于直接打开
+DEFAULT_KEEP_DAYS = 30
+
+
+def _query_time(info: dict) -> datetime.datetime | None:
+    """由文件名解析出的查询时间 (YYYYMMDD HHMM)"""
+    try:
+        return datetime.datetime.strptime(info["time"], "%Y%m%d %H%M")
+    except (KeyError, ValueError):
+        return None
+
+
+def _segment_paths(month: str) -> tuple:
+    return ARCHIVE_DIR / f"{month}.seg", ARCHIVE_DIR / f"{month}.idx"
+
+
+def load_index(month: str) -> list:
+    return read_json(_segment_paths(month)[1], [])
+
+
+def list_months() -> list:
+    if not ARCHIVE_DIR.exists():
+        return []
+    return sorted((p.stem for p in ARCHIVE_DIR.glob('*.idx')), reverse=True)
+
+
+def iter_archive_entries():
+    """遍历全部归档索引项 (附带所属月份)，不读取数据本身"""
+    for month in list_months():
+        for entry in load_index(month):
+            yield month, entry
+
+
+def read_archived(month: str, offset: int, length: int) -> dict:
+    """随机读取归档中的单条记录"""
+    with open(_segment_paths(month)[0], 'rb') as f:
+        f.seek(offset)
+        blob = f.read(length)
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def compact_history(keep_days: int = DEFAULT_KEEP_DAYS) -> int:
+    """
+    将 data_download 中早于 keep_days 天的散文件归档到月度分段文件，返回归档条数。
+    先追加数据并写入索引，最后才删除散文件：中途中断不会丢数据，
+    重新运行时已在索引中的文件直接删除，不会重复归档。
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=keep_days)
+
+    by_month = {}
+    with os.scandir(DATA_DOWNLOAD_DIR) as it:
+        for de in it:
+            if not de.is_file() or not de.name.endswith('.json'):
+                continue
+            info = parse_filename(de.name)
+            qt = _query_time(info) if info else None
+            if qt is None or qt >= cutoff:
+                continue
+            by_month.setdefault(qt.strftime("%Y-%m"), []).append((Path(de.path), info))
+
+    if not by_month:
+        return 0
+
+    ARCHIVE_DIR.mkdir(exist_ok=True)
+    archived = 0
+    for month, files in sorted(by_month.items()):
+        seg_path, idx_path = _segment_paths(month)
+        with file_lock(idx_path):
+            index = read_json(idx_path, [])
+            known = {e['file'] for e in index}
+            to_remove = []
+
+            with open(seg_path, 'ab') as seg:
+                offset = seg.tell()
+                for path, info in files:
+                    if path.name in known:
+                        to_remove.append(path)
+                        continue
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                    except (json.JSONDecodeError, IOError) as e:
+                        print(f"⚠️ 跳过无法读取的文件 {path.name}: {e}")
+                        continue
+                    blob = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                    seg.write(blob)
+                    index.append({
+                        "file": path.name,
+                        "name": info['name'],
+                        "range": info['range'],
+                        "time": info['time'],
+                        "offset": offset,
+                        "length": len(blob)
+                    })
+                    offset += len(blob)
+                    to_remove.append(path)
+                    archived += 1
+                seg.flush()
+                os.fsync(seg.fileno())
+
+            write_json_atomic(idx_path, index, compact=True)
+            for path in to_remove:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    return archived
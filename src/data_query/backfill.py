@@ -0,0 +1,362 @@
+import os
+import json
+import time
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.auth.token_service import TokenManager, LoginRequiredError
+from src.data_query.data_query import query_report, build_metrics, sync_records
+from src.data_query.schema import MetricRecord
+from src.utils.config import DATA_DOWNLOAD_DIR, load_json, save_json
+from src.utils.rate_limit import RateLimiter, SPOTLIGHT_RATE
+from src.utils.scheduler import BACKFILL
+from src.auth.accounts import prompt_accounts
+from src.service.client import daemon_client
+
+# 回填任务目录：每个任务一个子目录，包含 state.json (任务参数与失败分块)、done.log (已完成分块，每行一个，只追加)
+# 与 records.jsonl (按天数据，每行一个 MetricRecord 紧凑行)
+BACKFILL_DIR = DATA_DOWNLOAD_DIR / 'backfill'
+
+DEFAULT_CHUNK_DAYS = 7
+# 分块按天拉取且只请求第一页，分块天数不能超过聚光报表接口的单页条数上限，否则超出部分会被截断
+MAX_CHUNK_DAYS = 100
+DEFAULT_WORKERS = 4
+# 聚光接口调用频率上限 (次/秒)，所有并发线程共享
+DEFAULT_RATE = SPOTLIGHT_RATE
+MAX_ATTEMPTS = 3
+
+
+def _parse_date(s: str) -> datetime.date:
+    s = s.strip()
+    if len(s) == 8 and s.isdigit():
+        s = f"{s[:4]}-{s[4:6]}-{s[6:]}"
+    return datetime.datetime.strptime(s, "%Y-%m-%d").date()
+
+
+def split_date_range(start_date: str, end_date: str, chunk_days: int) -> list:
+    """将日期区间切分为若干个不超过 chunk_days 天的闭区间"""
+    start, end = _parse_date(start_date), _parse_date(end_date)
+    chunks = []
+    cur = start
+    while cur <= end:
+        chunk_end = min(end, cur + datetime.timedelta(days=chunk_days - 1))
+        chunks.append((cur.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+        cur = chunk_end + datetime.timedelta(days=1)
+    return chunks
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h:d}:{m:02d}:{s:02d}"
+
+
+class BackfillJob:
+    """
+    断点续传的批量回填任务：(账户 × 日期区间) 切块后并发拉取按天数据。
+    每完成一个分块立即追加到 done.log，程序中断后以相同参数重新运行即可从断点继续。
+    """
+
+    def __init__(self, accounts: list, start_date: str, end_date: str, chunk_days: int = DEFAULT_CHUNK_DAYS,
+                 workers: int = DEFAULT_WORKERS, rate: float = DEFAULT_RATE):
+        self.accounts = [{"advertiser_id": str(a['advertiser_id']), "advertiser_name": a['advertiser_name']}
+                         for a in accounts]
+        self.start_date = _parse_date(start_date).strftime("%Y-%m-%d")
+        self.end_date = _parse_date(end_date).strftime("%Y-%m-%d")
+        self.chunk_days = min(MAX_CHUNK_DAYS, max(1, int(chunk_days)))
+        self.workers = max(1, int(workers))
+        # 本任务自身的调用频率上限；全局额度与优先级排队由调度器负责
+        self.limiter = RateLimiter(rate, burst=self.workers)
+
+        # 任务 ID 由参数决定：相同账户 + 相同区间 + 相同切块 即为同一任务
+        ids = ",".join(sorted(a['advertiser_id'] for a in self.accounts))
+        digest = hashlib.md5(f"{ids}|{self.chunk_days}".encode('utf-8')).hexdigest()[:8]
+        self.job_id = f"{self.start_date.replace('-', '')}_{self.end_date.replace('-', '')}_{digest}"
+        self.job_dir = BACKFILL_DIR / self.job_id
+        self.state_path = self.job_dir / 'state.json'
+        self.done_path = self.job_dir / 'done.log'
+        self.records_path = self.job_dir / 'records.jsonl'
+
+        self._lock = threading.Lock()
+        self._done = set()
+        self._failed = {}
+
+    @classmethod
+    def from_state(cls, state_path) -> "BackfillJob":
+        """从已有的 checkpoint 文件恢复任务参数"""
+        params = load_json(state_path).get("params", {})
+        return cls(params["accounts"], params["start_date"], params["end_date"],
+                   chunk_days=params.get("chunk_days", DEFAULT_CHUNK_DAYS),
+                   workers=params.get("workers", DEFAULT_WORKERS),
+                   rate=params.get("rate", DEFAULT_RATE))
+
+    @staticmethod
+    def chunk_key(advertiser_id: str, start: str, end: str) -> str:
+        return f"{advertiser_id}:{start}:{end}"
+
+    def plan_chunks(self) -> list:
+        # 按日期区间优先、账户轮转排列，各账户进度均匀推进
+        ranges = split_date_range(self.start_date, self.end_date, self.chunk_days)
+        return [(a['advertiser_id'], a['advertiser_name'], s, e) for s, e in ranges for a in self.accounts]
+
+    def load_done(self) -> set:
+        """已完成的分块：done.log 中的记录，加上旧版 state.json 中的 done 列表"""
+        state = load_json(self.state_path) if self.state_path.exists() else {}
+        done = set(state.get("done", []))
+        if self.done_path.exists():
+            with open(self.done_path, 'r', encoding='utf-8') as f:
+                # 末行残缺的键与任何分块都不匹配，该分块会被重新拉取
+                done.update(line.strip() for line in f if line.strip())
+        return done
+
+    def _load_state(self):
+        state = load_json(self.state_path) if self.state_path.exists() else {}
+        self._done = self.load_done()
+        if state.get("done"):
+            # 旧版 checkpoint：完成列表迁入 done.log，之后的 _save_state 不再重写整份列表
+            self._append_done(sorted(self._done))
+
+    def _append_done(self, keys: list):
+        """追加登记已完成分块并落盘；每个分块只写一行，写入量与分块总数成正比"""
+        with open(self.done_path, 'a', encoding='utf-8') as f:
+            f.write("".join(f"{k}\n" for k in keys))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _save_state(self):
+        state = {
+            "params": {
+                "accounts": self.accounts,
+                "start_date": self.start_date,
+                "end_date": self.end_date,
+                "chunk_days": self.chunk_days,
+                "workers": self.workers,
+                "rate": self.limiter.rate
+            },
+            "failed": self._failed,
+            "updated_at": int(time.time())
+        }
+        save_json(self.state_path, state, compact=True)
+
+    def _fetch_chunk(self, advertiser_id: str, advertiser_name: str, start: str, end: str) -> list:
+        """拉取一个分块的按天数据，瞬时错误按指数退避重试"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.limiter.acquire()
+            try:
+                days = (_parse_date(end) - _parse_date(start)).days + 1
+                # 本地查询服务运行时交给服务端调度器，与其他窗口的交互查询统一排队
+                data_list = query_report(advertiser_id, start, end, time_unit="DAY", page_size=days, priority=BACKFILL)
+                break
+            except LoginRequiredError:
+                raise
+            except Exception:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                time.sleep(2 ** attempt)
+
+        records = []
+        for item in data_list:
+            # 按天返回的数据以 time 字段标识日期；单日分块可直接使用分块日期。
+            # 无法确定日期时整块按失败处理，不登记完成，避免留下续传也无法补齐的缺口
+            day = item.get("time") or (start if start == end else None)
+            if not day:
+                raise Exception("返回数据缺少日期字段 (time)")
+            try:
+                day = _parse_date(str(day)[:10]).strftime("%Y-%m-%d")
+            except ValueError:
+                raise Exception(f"无法解析返回数据的日期: {day}")
+            records.append(build_metrics(item, advertiser_id, advertiser_name, day, day))
+        return records
+
+    def _complete_chunk(self, key: str, records: list):
+        """先追加数据再登记完成，崩溃时最多重复一个分块 (读取时去重)"""
+        with self._lock:
+            with open(self.records_path, 'a', encoding='utf-8') as f:
+                for r in records:
+                    f.write(json.dumps(r.to_row(), ensure_ascii=False, separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._append_done([key])
+            self._done.add(key)
+            if self._failed.pop(key, None) is not None:
+                self._save_state()
+
+    @staticmethod
+    def _repair_tail(path):
+        """上次进程被强杀时末行可能残缺，补一个换行，避免与后续追加的内容粘连"""
+        if not path.exists() or path.stat().st_size == 0:
+            return
+        with open(path, 'rb+') as f:
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def load_records(self) -> list:
+        """读取任务已落盘的按天数据，按 (账户ID, 日期) 去重"""
+        if not self.records_path.exists():
+            return []
+        unique = {}
+        with open(self.records_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被强杀时最后一行可能不完整，对应分块未登记完成，会被重新拉取
+                    continue
+                r = MetricRecord.from_row(row) if isinstance(row, list) else MetricRecord.from_dict(row)
+                unique[(r.advertiser_id, r.start_date)] = r
+        return sorted(unique.values(), key=lambda r: (r.advertiser_id, r.start_date))
+
+    def run(self) -> bool:
+        """执行任务，全部分块完成时返回 True"""
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        self._repair_tail(self.records_path)
+        self._repair_tail(self.done_path)
+        self._load_state()
+
+        chunks = self.plan_chunks()
+        total = len(chunks)
+
+        # 预先在主线程校验/刷新各账户 Token，避免多个线程同时刷新同一账户 (本地查询服务运行时由服务端托管 Token)
+        skipped_ids = set()
+        for a in ([] if daemon_client.is_available() else self.accounts):
+            try:
+                TokenManager.get_valid_token(a['advertiser_id'])
+            except (LoginRequiredError, ValueError) as e:
+                print(f"❌ {e}，已跳过该账户")
+                skipped_ids.add(a['advertiser_id'])
+
+        pending = [c for c in chunks
+                   if self.chunk_key(c[0], c[2], c[3]) not in self._done and c[0] not in skipped_ids]
+        done_before = sum(1 for c in chunks if self.chunk_key(c[0], c[2], c[3]) in self._done)
+
+        print(f"\n🧩 回填任务 {self.job_id}: 共 {total} 个分块，已完成 {done_before}，待执行 {len(pending)}")
+        if done_before:
+            print("♻️ 检测到断点记录，从上次中断处继续。")
+        self._save_state()
+
+        started = time.monotonic()
+        finished = 0
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {pool.submit(self._fetch_chunk, *c): c for c in pending}
+            for fut in as_completed(futures):
+                advertiser_id, advertiser_name, start, end = futures[fut]
+                key = self.chunk_key(advertiser_id, start, end)
+                try:
+                    self._complete_chunk(key, fut.result())
+                except Exception as e:
+                    with self._lock:
+                        self._failed[key] = str(e)
+                        self._save_state()
+                    print(f"\n⚠️ [{advertiser_name}] {start} ~ {end} 拉取失败: {e}")
+
+                finished += 1
+                elapsed = time.monotonic() - started
+                speed = finished / elapsed if elapsed > 0 else 0.0
+                eta = (len(pending) - finished) / speed if speed else 0.0
+                print(f"\r⏳ 进度 {done_before + finished}/{total} | {speed:.2f} 块/秒 | "
+                      f"已用 {_format_duration(elapsed)} | 预计剩余 {_format_duration(eta)}   ", end="", flush=True)
+        finally:
+            # 中断时丢弃尚未开始的分块，已完成的分块均已写入 checkpoint
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        print()
+        remaining = total - len(self._done)
+        if remaining:
+            print(f"⚠️ 仍有 {remaining} 个分块未完成，重新运行该任务即可从断点续传。")
+            return False
+        print(f"✅ 回填完成！数据已保存至: {self.records_path.resolve()}")
+        return True
+
+
+def iter_jobs():
+    """遍历 backfill 目录下全部任务 (不论是否完成)"""
+    if not BACKFILL_DIR.exists():
+        return
+    for state_path in sorted(BACKFILL_DIR.glob('*/state.json')):
+        try:
+            yield BackfillJob.from_state(state_path)
+        except (KeyError, TypeError):
+            continue
+
+
+def iter_backfill_records():
+    """遍历全部回填任务已落盘的按天数据"""
+    for job in iter_jobs():
+        yield from job.load_records()
+
+
+def list_unfinished_jobs() -> list:
+    """列出存在断点记录且尚未完成的回填任务"""
+    jobs = []
+    for job in iter_jobs():
+        done = job.load_done()
+        total = len(job.plan_chunks())
+        if len(done) < total:
+            jobs.append((job, len(done), total))
+    return jobs
+
+
+def sync_records_to_feishu(records: list) -> int:
+    """
+    按多维表格分片并行写入回填数据 (写入前整表查重，重复执行不会产生重复数据)，返回成功条数。
+    本地查询服务运行时整批交给服务写入。
+    """
+    return sync_records(records)
+
+
+def backfill_flow():
+    """回填交互流程：选择账户与区间 -> 并发拉取 -> 可选同步飞书"""
+    job = None
+    unfinished = list_unfinished_jobs()
+    if unfinished:
+        print("\n发现未完成的回填任务：")
+        for i, (j, done, total) in enumerate(unfinished, 1):
+            print(f"{i}. {j.start_date} ~ {j.end_date} | {len(j.accounts)} 个账户 | 进度 {done}/{total}")
+        choice = input("输入序号继续该任务，直接回车新建任务: ").strip()
+        if choice.isdigit() and 0 < int(choice) <= len(unfinished):
+            job = unfinished[int(choice) - 1][0]
+
+    if job is None:
+        accounts = prompt_accounts()
+        if not accounts:
+            return
+
+        print("\n请输入回填区间 (格式: 20230101 或 2023-01-01)")
+        try:
+            start = _parse_date(input("开始日期: "))
+            end = _parse_date(input("结束日期: "))
+        except ValueError:
+            print("❌ 日期格式错误")
+            return
+        if start > end:
+            print("❌ 开始日期不能晚于结束日期")
+            return
+
+        chunk_in = input(f"每个分块天数 (默认 {DEFAULT_CHUNK_DAYS}，最大 {MAX_CHUNK_DAYS}): ").strip()
+        workers_in = input(f"并发线程数 (默认 {DEFAULT_WORKERS}): ").strip()
+        job = BackfillJob(accounts, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"),
+                          chunk_days=int(chunk_in) if chunk_in.isdigit() else DEFAULT_CHUNK_DAYS,
+                          workers=int(workers_in) if workers_in.isdigit() else DEFAULT_WORKERS)
+
+    try:
+        job.run()
+    except KeyboardInterrupt:
+        print("\n⏸️ 已中断，进度已保存，下次可继续。")
+        return
+
+    records = job.load_records()
+    if not records:
+        return
+    sync = input(f"\n是否将 {len(records)} 条按天数据同步到飞书多维表格? (y/n): ").strip().lower()
+    if sync == 'y':
+        ok = sync_records_to_feishu(records)
+        print(f"📤 飞书同步完成：{ok}/{len(records)} 条")
+    else:
+        print("已跳过飞书同步。")
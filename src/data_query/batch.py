@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.auth.accounts import prompt_accounts
+from src.data_query.data_query import get_date_range, query_report, fetch_reports_async, build_metrics, sync_records
+from src.share.exporter import save_report
+from src.data_query.schema import format_metric
+from src.service.client import daemon_client
+from src.utils.scheduler import DAILY
+from src.utils.aio import run_sync
+
+DEFAULT_WORKERS = 4
+
+
+def _query_via_daemon(accounts: list, start_date: str, end_date: str, workers: int, priority: int) -> list:
+    """本地查询服务运行时逐个账户交给服务 (服务端排队与合并请求)，异常作为结果返回"""
+    def query(account):
+        try:
+            return query_report(account['advertiser_id'], start_date, end_date, priority=priority)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(query, accounts))
+
+
+def run_batch_query(accounts: list, start_date: str, end_date: str, workers: int = DEFAULT_WORKERS,
+                    priority: int = DAILY) -> tuple:
+    """
+    对一批账户并发查询同一时间段的汇总数据并保存到本地 (调用频率由调度器统一控制)。
+    本地查询服务未运行时，全部请求在同一个事件循环中并发发出，不再为每个账户占用一个线程。
+    返回 (有数据的记录列表, 无数据的账户列表, {账户名称: 错误信息})。
+    """
+    if daemon_client.is_available():
+        results = _query_via_daemon(accounts, start_date, end_date, workers, priority)
+    else:
+        results = run_sync(fetch_reports_async(accounts, start_date, end_date, priority=priority))
+
+    records, empty, failed = [], [], {}
+    for account, data_list in zip(accounts, results):
+        if isinstance(data_list, BaseException):
+            failed[account['advertiser_name']] = str(data_list)
+            continue
+        if not data_list:
+            empty.append(account)
+            continue
+        record = build_metrics(data_list[0], account['advertiser_id'], account['advertiser_name'],
+                               start_date, end_date)
+        save_report(record.to_dict(), record.advertiser_name, start_date, end_date, copy=False)
+        records.append(record)
+
+    records.sort(key=lambda r: r.get("消费"), reverse=True)
+    return records, empty, failed
+
+
+def batch_query_flow():
+    """批量查询交互流程：选择账户 (分组/检索) -> 选择日期 -> 并发查询 -> 可选同步飞书"""
+    accounts = prompt_accounts()
+    if not accounts:
+        return
+
+    start_date, end_date = get_date_range()
+    print(f"\n⏳ 正在批量拉取 {len(accounts)} 个账户的数据 ({start_date} ~ {end_date})...")
+    records, empty, failed = run_batch_query(accounts, start_date, end_date)
+
+    print("\n" + "=" * 70)
+    print(f"{'账户名称':<25} {'消费':>12} {'展现量':>12} {'点击量':>10}")
+    print("-" * 70)
+    for r in records:
+        cost, impressions, clicks = (format_metric(k, r.get(k)) for k in ('消费', '展现量', '点击量'))
+        print(f"{r.advertiser_name:<25} {cost:>12} {impressions:>12} {clicks:>10}")
+    print("=" * 70)
+    print(f"✅ 有数据 {len(records)} 个 | ⚠️ 无消耗或未产出 {len(empty)} 个 | ❌ 失败 {len(failed)} 个")
+    for name, err in failed.items():
+        print(f"  ❌ {name}: {err}")
+
+    if not records:
+        return
+    sync = input(f"\n是否将 {len(records)} 条数据同步到飞书多维表格? (y/n): ").strip().lower()
+    if sync == 'y':
+        ok = sync_records(records)
+        print(f"\n📤 飞书同步完成：{ok}/{len(records)} 条")
+    else:
+        print("已跳过飞书同步。")
@@ -1,9 +1,15 @@
 import requests
 import datetime
+from concurrent.futures import Future
 from src.auth.token_service import TokenManager, LoginRequiredError
 from src.share.exporter import save_report
 from src.utils.decorators import interactive_retry
 from src.share.feishu_sync import feishu_client
+from src.share.feishu_writer import write_records
+from src.data_query.schema import MetricRecord
+from src.service.client import daemon_client
+from src.utils.aio import get_session, gather_limited, run_sync
+from src.utils.scheduler import scheduler, INTERACTIVE, DAILY
 
 
 def get_date_range():
@@ -16,6 +22,7 @@ def get_date_range():
     print("\n" + "!" * 50)
     print("⚠️  重要提示：本工具查询的是聚光账户【离线数据】")
     print("🕒  因平台数据产出延迟，请务必于每日 10:00 后查询昨日数据")
+    print("💡  也可使用主菜单【等待昨日数据产出后自动拉取】，数据一产出即自动拉取")
     print("!" * 50 + "\n")
 
     print("1. 昨天 (最常用)")
@@ -58,66 +65,141 @@ def get_date_range():
     return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
 
 
-@interactive_retry
-def run_query_flow(advertiser_id, advertiser_name):
-    """查询主流程：API请求 -> 数据组装 -> 存档 -> 飞书同步"""
-    try:
-        token = TokenManager.get_valid_token(advertiser_id)
-    except LoginRequiredError as e:
-        print(f"❌ {e}")
-        return
+REPORT_URL = "https://adapi.xiaohongshu.com/api/open/jg/data/report/offline/account"
 
-    # 获取日期范围 (含新版提示)
-    start_date, end_date = get_date_range()
 
-    url = "https://adapi.xiaohongshu.com/api/open/jg/data/report/offline/account"
+async def fetch_report_async(advertiser_id, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                             page_size: int = 1) -> list:
+    """
+    调用聚光离线报表接口，返回 data_list (无消耗或数据未产出时为空列表)。
+    Token 失效时抛出 LoginRequiredError，接口报错时抛出 Exception。
+    """
+    token = await TokenManager.get_valid_token_async(advertiser_id)
     payload = {
         "advertiser_id": advertiser_id,
         "start_date": start_date,
         "end_date": end_date,
-        "time_unit": "SUMMARY",
+        "time_unit": time_unit,
         "sort_column": "fee",
         "sort": "desc",
         "page_num": 1,
-        "page_size": 1
+        "page_size": page_size
     }
 
-    print(f"\n⏳ 正在拉取 [{advertiser_name}] 的数据 ({start_date} ~ {end_date})...")
-    resp = requests.post(url, json=payload, headers={"Access-Token": token})
-    res_json = resp.json()
+    session = await get_session()
+    async with session.post(REPORT_URL, json=payload, headers={"Access-Token": token}) as resp:
+        res_json = await resp.json(content_type=None)
 
     if res_json.get('code') != 0:
         raise Exception(f"API请求失败: {res_json.get('msg')}")
 
-    if not res_json.get('data') or not res_json['data'].get('data_list'):
+    return (res_json.get('data') or {}).get('data_list') or []
+
+
+def submit_report(advertiser_id, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                  page_size: int = 1, priority: int = INTERACTIVE) -> Future:
+    """按 priority 在调度器中排队，轮到后在共享事件循环上请求；返回 Future (可用 scheduler.promote 提升优先级)"""
+    def call():
+        return run_sync(fetch_report_async(advertiser_id, start_date, end_date, time_unit=time_unit,
+                                           page_size=page_size))
+
+    return scheduler.submit(call, priority=priority, account=advertiser_id)
+
+
+def fetch_report(advertiser_id, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                 page_size: int = 1, priority: int = INTERACTIVE) -> list:
+    """fetch_report_async 的同步包装：经调度器排队后执行并等待结果"""
+    return submit_report(advertiser_id, start_date, end_date, time_unit=time_unit, page_size=page_size,
+                         priority=priority).result()
+
+
+async def fetch_reports_async(accounts: list, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                              priority: int = DAILY, limit: int = 100) -> list:
+    """
+    单个事件循环内并发查询多个账户，同时在途请求不超过 limit。
+    每个请求发出前先在调度器中按 priority 排队领取许可，与其他聚光调用共享频率额度。
+    返回与 accounts 顺序一致的列表，每项为 data_list 或查询时抛出的异常。
+    """
+    async def fetch(account):
+        await scheduler.admit_async(priority=priority, account=account['advertiser_id'])
+        return await fetch_report_async(account['advertiser_id'], start_date, end_date, time_unit=time_unit)
+
+    return await gather_limited((fetch(a) for a in accounts), limit)
+
+
+def build_metrics(data: dict, advertiser_id, advertiser_name: str, start_date: str, end_date: str) -> MetricRecord:
+    """构建报表记录：包含“元数据”和“业务指标” (字段定义见 schema.METRIC_FIELDS)"""
+    return MetricRecord.from_api(data, advertiser_id, advertiser_name, start_date, end_date)
+
+
+def query_report(advertiser_id, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                 page_size: int = 1, priority: int = INTERACTIVE) -> list:
+    """
+    优先交给本地守护进程 (共享 Token/缓存并合并相同请求)，未运行时直接请求聚光接口。
+    只有连接不上守护进程时才回退直连；服务端仍在处理时 (如读取超时) 直接报错，避免同一请求调用两次。
+    """
+    if daemon_client.is_available():
+        try:
+            return daemon_client.fetch_report(advertiser_id, start_date, end_date, time_unit=time_unit,
+                                              page_size=page_size, priority=priority)
+        except requests.ConnectionError:
+            print("⚠️ 无法连接本地查询服务，改为直接请求接口。")
+    return fetch_report(advertiser_id, start_date, end_date, time_unit=time_unit, page_size=page_size,
+                        priority=priority)
+
+
+def sync_record(record: MetricRecord) -> bool:
+    """同步单条记录到飞书：优先交给本地守护进程，未运行时本进程直接同步"""
+    if daemon_client.is_available():
+        try:
+            ok = daemon_client.sync_to_feishu(record)
+            print("✅ 飞书同步成功！(本地查询服务)" if ok else "❌ 飞书同步失败，详情请查看本地查询服务窗口。")
+            return ok
+        except requests.ConnectionError:
+            print("⚠️ 无法连接本地查询服务，改为本进程直接同步。")
+    return feishu_client.sync_to_feishu(record, record.advertiser_id, record.advertiser_name,
+                                        record.start_date, record.end_date)
+
+
+def sync_records(records: list) -> int:
+    """
+    批量同步到飞书，返回成功 (含已存在) 条数。
+    本地查询服务运行时整批交给服务写入，否则本进程按多维表格分片并行批量写入。
+    """
+    if daemon_client.is_available():
+        try:
+            return daemon_client.sync_records(records)
+        except requests.ConnectionError:
+            print("⚠️ 无法连接本地查询服务，改为本进程直接同步。")
+    return write_records(records)
+
+
+@interactive_retry
+def run_query_flow(advertiser_id, advertiser_name):
+    """查询主流程：API请求 -> 数据组装 -> 存档 -> 飞书同步"""
+    # 先行校验授权状态，避免选完日期才发现 Token 失效 (本地查询服务运行时由服务端托管 Token)
+    if not daemon_client.is_available():
+        try:
+            TokenManager.get_valid_token(advertiser_id)
+        except LoginRequiredError as e:
+            print(f"❌ {e}")
+            return
+
+    # 获取日期范围 (含新版提示)
+    start_date, end_date = get_date_range()
+
+    print(f"\n⏳ 正在拉取 [{advertiser_name}] 的数据 ({start_date} ~ {end_date})...")
+    try:
+        data_list = query_report(advertiser_id, start_date, end_date)
+    except LoginRequiredError as e:
+        print(f"❌ {e}")
+        return
+
+    if not data_list:
         print(f"⚠️ 提示：账户 [{advertiser_name}] 在该时间段无消耗或数据尚未产出。")
         return
 
-    data = res_json['data']['data_list'][0]
-
-    # 构建数据字典：包含“元数据”和“业务指标”
-    metrics = {
-        "账户ID": str(advertiser_id),
-        "账户名称": advertiser_name,
-        "开始日期": start_date,
-        "结束日期": end_date,
-
-        "消费": data.get("fee", 0),
-        "展现量": data.get("impression", 0),
-        "点击量": data.get("click", 0),
-        "点击率": data.get("ctr", 0),
-        "平均点击成本": data.get("acp", 0),
-        "平均千次展现费用": data.get("cpm", 0),
-        "互动量": data.get("interaction", 0),
-        "私信进线数": data.get("message_consult", 0),
-        "私信进线成本": data.get("message_consult_cpl", 0),
-        "私信开口数": data.get("initiative_message", 0),
-        "私信开口条数": data.get("message", 0),
-        "私信开口成本": data.get("initiative_message_cpl", 0),
-        "私信留资数": data.get("msg_leads_num", 0),
-        "私信留资成本": data.get("msg_leads_cost", 0),
-        "平均响应时长(分)": data.get("message_fst_reply_time_avg", 0)
-    }
+    metrics = build_metrics(data_list[0], advertiser_id, advertiser_name, start_date, end_date)
 
     print("\n" + "=" * 50)
     print(f"📊 {advertiser_name}")
@@ -125,20 +207,18 @@ def run_query_flow(advertiser_id, advertiser_name):
     print("-" * 50)
 
     # 打印时跳过元数据字段，仅显示业务指标
-    meta_keys = ["账户ID", "账户名称", "开始日期", "结束日期"]
-    for k, v in metrics.items():
-        if k not in meta_keys:
-            print(f"{k:<15}: {v}")
+    for k, v in metrics.display_items():
+        print(f"{k:<15}: {v}")
     print("=" * 50)
 
     # 1. 保存到本地 JSON/Excel
-    save_report(metrics, advertiser_name, start_date, end_date)
+    save_report(metrics.to_dict(), advertiser_name, start_date, end_date)
 
     # 2. 选择同步到飞书
     print("\n🚀 [下一步操作]")
     sync_feishu = input("是否将此数据同步到飞书多维表格? (y/n): ").strip().lower()
 
     if sync_feishu == 'y':
-        feishu_client.sync_to_feishu(metrics, str(advertiser_id), advertiser_name, start_date, end_date)
+        sync_record(metrics)
     else:
         print("已跳过飞书同步。")
\ No newline at end of file
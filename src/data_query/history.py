@@ -6,45 +6,90 @@ import platform
 import subprocess
 from pathlib import Path
 from src.utils.config import DATA_DOWNLOAD_DIR
-from src.share.feishu_sync import feishu_client
+from src.share.exporter import parse_filename
+from src.data_query.archive import iter_archive_entries, read_archived, compact_history, DEFAULT_KEEP_DAYS
+from src.data_query.backfill import iter_backfill_records
+from src.data_query.schema import MetricRecord, format_metric
+from src.data_query.data_query import sync_record
 
-def parse_filename(filename: str):
-    """解析文件名信息 (仅作为读取旧版本文件的兜底方案)"""
-    try:
-        stem = Path(filename).stem
-        parts = stem.split('_')
-        if len(parts) >= 5:
-            query_time = f"{parts[-2]} {parts[-1].replace('.', ':')}"
-            end_date = parts[-3]
-            start_date = parts[-4]
-            account_name = "_".join(parts[:-4])
-            return {
-                "name": account_name,
-                "range": f"{start_date} -> {end_date}",
-                "time": query_time,
-                "file": filename
-            }
-    except Exception:
-        pass
-    return None
-
-def load_and_format_content(file_path: Path) -> str:
-    """读取 JSON 并格式化为易读文本"""
+class HistoryEntry:
+    """一条历史记录：可能是 data_download 下的散文件，也可能位于月度归档中"""
+    __slots__ = ("name", "range", "time", "file", "path", "month", "offset", "length")
+
+    def __init__(self, info: dict, path: Path = None, month: str = None, offset: int = 0, length: int = 0):
+        self.name = info['name']
+        self.range = info['range']
+        self.time = info['time']
+        self.file = info['file']
+        self.path = path
+        self.month = month
+        self.offset = offset
+        self.length = length
+
+    @property
+    def archived(self) -> bool:
+        return self.path is None
+
+    def load(self) -> dict:
+        if self.archived:
+            return read_archived(self.month, self.offset, self.length)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def list_history_entries() -> list:
+    """
+    汇总散文件与归档索引中的全部历史记录，按查询时间倒序。
+    查询时间取自文件名 (YYYYMMDD HHMM 可直接按字符串排序)，无需逐个 stat 文件。
+    """
+    entries = []
+    with os.scandir(DATA_DOWNLOAD_DIR) as it:
+        for de in it:
+            if de.is_file() and de.name.endswith('.json'):
+                info = parse_filename(de.name)
+                if info:
+                    entries.append(HistoryEntry(info, path=Path(de.path)))
+    for month, e in iter_archive_entries():
+        entries.append(HistoryEntry(e, month=month, offset=e['offset'], length=e['length']))
+    entries.sort(key=lambda x: x.time, reverse=True)
+    return entries
+
+
+def iter_local_records():
+    """
+    遍历本地全部数据 (查询存档 + 归档 + 回填)，逐条产出 MetricRecord。
+    缺少元数据 (账户ID / 日期) 的旧版文件无法归属，直接跳过。
+    """
+    for e in list_history_entries():
+        try:
+            data = e.load()
+        except Exception:
+            continue
+        if data.get("账户ID") and data.get("开始日期") and data.get("结束日期"):
+            yield MetricRecord.from_dict(data)
+    yield from iter_backfill_records()
+
+
+def format_content(data: dict) -> str:
+    """将记录格式化为易读文本"""
+    text = ""
+    for k, v in data.items():
+        text += f"{k}: {format_metric(k, v)}\n"
+    return text
+
+
+def load_and_format_content(entry: HistoryEntry) -> str:
+    """读取记录并格式化为易读文本"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        text = ""
-        for k, v in data.items():
-            text += f"{k}: {v}\n"
-        return text
+        return format_content(entry.load())
     except Exception as e:
         return f"无法读取文件内容: {e}"
 
-def open_as_txt(file_path: Path):
+def open_as_txt(entry: HistoryEntry):
     """调用系统默认编辑器打开文件内容"""
-    content = load_and_format_content(file_path)
+    content = load_and_format_content(entry)
     temp_dir = tempfile.gettempdir()
-    target_filename = file_path.stem + ".txt"
+    target_filename = Path(entry.file).stem + ".txt"
     temp_path = os.path.join(temp_dir, target_filename)
     
     try:
@@ -63,9 +108,9 @@ def open_as_txt(file_path: Path):
 
 def view_history_flow():
     """历史记录查看与操作主流程"""
-    files = sorted(DATA_DOWNLOAD_DIR.glob('*.json'), key=lambda x: x.stat().st_mtime, reverse=True)
+    entries = list_history_entries()
     
-    if not files:
+    if not entries:
         print("\n📂 data_download 目录为空，暂无查询记录。")
         return
 
@@ -73,34 +118,29 @@ def view_history_flow():
     print(f"{'序号':<5} {'账户名称':<25} {'数据周期':<25} {'查询时间 (YYYYMMDD HHMM)'}")
     print("-" * 90)
     
-    valid_files = []
-    
-    for f in files:
-        info = parse_filename(f.name)
-        if info:
-            valid_files.append(f)
-            idx = len(valid_files)
-            print(f"{idx:<5} {info['name']:<25} {info['range']:<25} {info['time']}")
-    
-    if not valid_files:
-        print("没有符合命名规范的历史文件。")
-        return
+    for idx, e in enumerate(entries, 1):
+        mark = " [归档]" if e.archived else ""
+        print(f"{idx:<5} {e.name:<25} {e.range:<25} {e.time}{mark}")
 
     print("="*90)
 
-    choice = input("\n请输入文件序号进行操作 (0 返回): ").strip()
+    choice = input(f"\n请输入文件序号进行操作 (c 归档 {DEFAULT_KEEP_DAYS} 天前的记录, 0 返回): ").strip().lower()
+    if choice == 'c':
+        count = compact_history()
+        print(f"🗜️ 已归档 {count} 条历史记录。" if count else "没有需要归档的历史记录。")
+        return
     if not choice.isdigit() or int(choice) == 0:
         return
     
     idx = int(choice) - 1
-    if not (0 <= idx < len(valid_files)):
+    if not (0 <= idx < len(entries)):
         print("❌ 无效序号")
         return
     
-    target_file = valid_files[idx]
+    target = entries[idx]
     
     while True:
-        print(f"\n已选中: {target_file.name}")
+        print(f"\n已选中: {target.file}")
         print("1. 复制内容到剪贴板")
         print("2. 打开文件 (文本模式)")
         print("3. 导出到飞书")
@@ -109,17 +149,16 @@ def view_history_flow():
         action = input("请选择操作: ").strip()
         
         if action == '1':
-            content = load_and_format_content(target_file)
+            content = load_and_format_content(target)
             pyperclip.copy(content)
             print("✅ 内容已复制到剪贴板！")
             
         elif action == '2':
-            open_as_txt(target_file)
+            open_as_txt(target)
             
         elif action == '3':
             try:
-                with open(target_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = target.load()
                 
                 acc_id = data.get("账户ID")
                 if not acc_id:
@@ -133,14 +172,15 @@ def view_history_flow():
                     end_date = data.get("结束日期")
                 else:
                     # 兼容不包含元数据的旧版文件
-                    info = parse_filename(target_file.name)
-                    dates = info['range'].split(' -> ')
+                    dates = target.range.split(' -> ')
                     start_date = dates[0]
                     end_date = dates[1]
-                    acc_name = info['name']
+                    acc_name = target.name
                     print(f"⚠️ 警告: 正在使用文件名 [{acc_name}] 进行同步，特殊字符可能已丢失，建议重新查询。")
 
-                feishu_client.sync_to_feishu(data, str(acc_id), acc_name, start_date, end_date)
+                # 本地查询服务运行时交给服务统一同步，否则本进程直接同步
+                record = MetricRecord(str(acc_id), acc_name, start_date, end_date, MetricRecord.from_dict(data).values)
+                sync_record(record)
                 
             except Exception as e:
                 print(f"❌ 同步过程出错: {e}")
@@ -0,0 +1,125 @@
+import time
+import random
+import datetime
+from src.auth.accounts import AccountRegistry, prompt_accounts
+from src.data_query.batch import run_batch_query
+from src.data_query.data_query import query_report, sync_records
+from src.utils.scheduler import DAILY
+
+# ========================================================
+# T+1 离线数据就绪探测
+# 逻辑：聚光离线数据通常在次日上午陆续产出。抽取少量“前一天有消耗”的账户，
+#      以极小的查询 (SUMMARY, page_size=1) 探测昨日数据是否已落地；
+#      未就绪时按指数退避等待，就绪后立即对全部目标账户批量拉取并同步飞书。
+# ========================================================
+
+SAMPLE_SIZE = 5
+# 抽样账户中有数据的比例达到该值即视为就绪
+READY_RATIO = 0.6
+INITIAL_INTERVAL = 120
+BACKOFF_FACTOR = 1.5
+MAX_INTERVAL = 1200
+# 超过该时刻仍未就绪则放弃本次等待 (24 小时制)
+DEADLINE_HOUR = 15
+
+
+def _has_data(account: dict, date: str) -> bool:
+    try:
+        return bool(query_report(account['advertiser_id'], date, date, priority=DAILY))
+    except Exception as e:
+        print(f"⚠️ 探测 [{account['advertiser_name']}] 失败: {e}")
+        return False
+
+
+def pick_sample(accounts: list, target_date: str, size: int = SAMPLE_SIZE) -> list:
+    """
+    抽取探测样本：优先选择前一天有数据的账户 (无消耗账户永远返回空，无法用于判断)。
+    最多检查 size * 3 个账户，避免账户很多时启动阶段调用过多。
+    """
+    prev = (datetime.datetime.strptime(target_date, "%Y-%m-%d").date()
+            - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    pool = random.sample(accounts, min(len(accounts), size * 3))
+    active = []
+    for a in pool:
+        if _has_data(a, prev):
+            active.append(a)
+            if len(active) >= size:
+                break
+    return active or pool[:size]
+
+
+def wait_until_ready(accounts: list, target_date: str, deadline: datetime.datetime) -> bool:
+    """按指数退避探测 target_date 的数据是否已产出；超过 deadline 返回 False"""
+    sample = pick_sample(accounts, target_date)
+    need = max(1, round(len(sample) * READY_RATIO))
+    print(f"🔎 抽样 {len(sample)} 个账户探测 {target_date} 数据，{need} 个有数据即视为就绪")
+
+    interval = INITIAL_INTERVAL
+    while True:
+        ready = 0
+        for a in sample:
+            if _has_data(a, target_date):
+                ready += 1
+                if ready >= need:
+                    # 已达到就绪条件，剩余样本无需再探测
+                    break
+        now = datetime.datetime.now()
+        print(f"[{now.strftime('%H:%M:%S')}] 已产出 {ready}/{len(sample)}")
+        if ready >= need:
+            return True
+
+        remaining = (deadline - now).total_seconds()
+        if remaining <= 0:
+            return False
+        wait = min(interval, remaining)
+        print(f"⏳ 数据尚未就绪，{int(wait)} 秒后再次探测...")
+        time.sleep(wait)
+        interval = min(MAX_INTERVAL, interval * BACKOFF_FACTOR)
+
+
+def run_when_ready(accounts: list, target_date: str = None, sync: bool = True) -> bool:
+    """等待数据就绪后批量拉取 (并同步飞书)；数据在截止时间前未就绪返回 False"""
+    if not accounts:
+        print("⚠️ 没有需要拉取的账户")
+        return False
+    if target_date is None:
+        target_date = (datetime.date.today() - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    deadline = datetime.datetime.combine(datetime.date.today(), datetime.time(DEADLINE_HOUR))
+
+    if not wait_until_ready(accounts, target_date, deadline):
+        print(f"❌ 截至 {DEADLINE_HOUR}:00 {target_date} 的数据仍未就绪，已停止等待。")
+        return False
+
+    print(f"\n🚀 数据已就绪，开始拉取 {len(accounts)} 个账户 {target_date} 的数据...")
+    records, empty, failed = run_batch_query(accounts, target_date, target_date)
+    print(f"✅ 有数据 {len(records)} 个 | ⚠️ 无消耗 {len(empty)} 个 | ❌ 失败 {len(failed)} 个")
+    for name, err in failed.items():
+        print(f"  ❌ {name}: {err}")
+
+    if sync and records:
+        ok = sync_records(records)
+        print(f"📤 飞书同步完成：{ok}/{len(records)} 条")
+    return True
+
+
+def resolve_group(group_name: str = None) -> list:
+    """命令行模式：按分组名取账户，未指定时为全部账户"""
+    registry = AccountRegistry.load()
+    if not group_name:
+        return list(registry.accounts)
+    members = registry.group_members(group_name)
+    if not members:
+        print(f"⚠️ 分组 [{group_name}] 不存在或没有已授权账户")
+    return members
+
+
+def readiness_flow():
+    """交互流程：选择账户 -> 等待昨日数据就绪 -> 自动拉取并同步飞书"""
+    accounts = prompt_accounts()
+    if not accounts:
+        return
+    sync = input("数据就绪后是否自动同步到飞书? (y/n): ").strip().lower() == 'y'
+    try:
+        run_when_ready(accounts, sync=sync)
+    except KeyboardInterrupt:
+        print("\n⏹️ 已取消等待。")
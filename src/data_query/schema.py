@@ -0,0 +1,175 @@
+from array import array
+from typing import Any, NamedTuple
+
+# ========================================================
+# 指标 Schema 注册表
+# 聚光接口字段名 / 中文展示名 / 飞书字段类型 / 数值类型 的唯一定义处，
+# 查询、本地存档、飞书建表与写入均从这里派生，新增指标只需改动此处。
+# ========================================================
+
+# 飞书多维表格字段类型
+FEISHU_TEXT = 1
+FEISHU_NUMBER = 2
+FEISHU_DATE = 5
+
+
+class MetricField(NamedTuple):
+    api_name: str
+    display_name: str
+    feishu_type: int
+    dtype: type
+    # 比率类指标，展示为百分比
+    percent: bool = False
+
+
+METRIC_FIELDS = (
+    MetricField("fee", "消费", FEISHU_NUMBER, float),
+    MetricField("impression", "展现量", FEISHU_NUMBER, int),
+    MetricField("click", "点击量", FEISHU_NUMBER, int),
+    MetricField("ctr", "点击率", FEISHU_NUMBER, float, percent=True),
+    MetricField("acp", "平均点击成本", FEISHU_NUMBER, float),
+    MetricField("cpm", "平均千次展现费用", FEISHU_NUMBER, float),
+    MetricField("interaction", "互动量", FEISHU_NUMBER, int),
+    MetricField("message_consult", "私信进线数", FEISHU_NUMBER, int),
+    MetricField("message_consult_cpl", "私信进线成本", FEISHU_NUMBER, float),
+    MetricField("initiative_message", "私信开口数", FEISHU_NUMBER, int),
+    MetricField("message", "私信开口条数", FEISHU_NUMBER, int),
+    MetricField("initiative_message_cpl", "私信开口成本", FEISHU_NUMBER, float),
+    MetricField("msg_leads_num", "私信留资数", FEISHU_NUMBER, int),
+    MetricField("msg_leads_cost", "私信留资成本", FEISHU_NUMBER, float),
+    MetricField("message_fst_reply_time_avg", "平均响应时长(分)", FEISHU_NUMBER, float),
+)
+
+# 元数据字段 (中文展示名)
+META_KEYS = ("账户ID", "账户名称", "开始日期", "结束日期")
+
+METRIC_NAMES = tuple(f.display_name for f in METRIC_FIELDS)
+METRIC_INDEX = {f.display_name: i for i, f in enumerate(METRIC_FIELDS)}
+
+# 飞书建表字段：账户名称 + 日期 + 全部业务指标 (账户ID 体现在表名中，不单独建列)
+FEISHU_TABLE_FIELDS = [
+    {"field_name": "账户名称", "type": FEISHU_TEXT},
+    {"field_name": "开始日期", "type": FEISHU_DATE},
+    {"field_name": "结束日期", "type": FEISHU_DATE},
+] + [{"field_name": f.display_name, "type": f.feishu_type} for f in METRIC_FIELDS]
+
+
+def clean_number(value: Any) -> float:
+    """数据清洗：将各种格式的数值统一转换为 float"""
+    if value is None: return 0.0
+    if isinstance(value, (int, float)): return float(value)
+    if isinstance(value, str):
+        s = value.strip().replace(',', '')
+        if '%' in s:
+            try:
+                return float(s.replace('%', '')) / 100.0
+            except ValueError:
+                return 0.0
+        if s in ['-', 'N/A', 'nan', 'null', '']: return 0.0
+        try:
+            return float(s)
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def _cast(field: MetricField, value: float):
+    """按 Schema 声明的类型还原数值 (计数类指标为 int)"""
+    return int(round(value)) if field.dtype is int else value
+
+
+def format_value(field: MetricField, value: float) -> str:
+    """展示编码 (控制台 / 剪贴板)：比率为百分比，计数为整数，其余保留两位小数，均带千分位"""
+    if field.percent:
+        return f"{value * 100:.2f}%"
+    if field.dtype is int:
+        return f"{int(round(value)):,}"
+    return f"{value:,.2f}"
+
+
+def format_metric(name: str, value: Any) -> str:
+    """按中文指标名格式化展示 (兼容旧版存档中的原始字符串)；非指标字段原样输出"""
+    idx = METRIC_INDEX.get(name)
+    if idx is None:
+        return str(value)
+    return format_value(METRIC_FIELDS[idx], clean_number(value))
+
+
+class MetricRecord:
+    """
+    紧凑的单行报表记录：元数据 + 按 METRIC_FIELDS 顺序排列的 array('d') 数值。
+    入库时解析一次，之后直接编码为本地 JSON / 飞书字段 / 紧凑行格式，不再重复清洗。
+    """
+    __slots__ = ("advertiser_id", "advertiser_name", "start_date", "end_date", "values")
+
+    def __init__(self, advertiser_id, advertiser_name: str, start_date: str, end_date: str, values: array):
+        self.advertiser_id = str(advertiser_id)
+        self.advertiser_name = advertiser_name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.values = values
+
+    @classmethod
+    def from_api(cls, data: dict, advertiser_id, advertiser_name: str, start_date: str,
+                 end_date: str) -> "MetricRecord":
+        """由聚光接口返回的 data_list 单项构建"""
+        values = array('d', (clean_number(data.get(f.api_name, 0)) for f in METRIC_FIELDS))
+        return cls(advertiser_id, advertiser_name, start_date, end_date, values)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetricRecord":
+        """由中文键字典 (历史存档文件) 构建"""
+        values = array('d', (clean_number(data.get(name, 0)) for name in METRIC_NAMES))
+        return cls(data.get("账户ID", ""), data.get("账户名称", ""), data.get("开始日期", ""),
+                   data.get("结束日期", ""), values)
+
+    @classmethod
+    def from_row(cls, row: list) -> "MetricRecord":
+        """由 to_row() 产生的紧凑行构建"""
+        return cls(row[0], row[1], row[2], row[3], array('d', row[4:]))
+
+    def get(self, name: str, default: Any = None) -> Any:
+        idx = METRIC_INDEX.get(name)
+        if idx is None:
+            return default
+        return _cast(METRIC_FIELDS[idx], self.values[idx])
+
+    def metric_items(self):
+        """按 Schema 顺序产出 (中文指标名, 数值)"""
+        for f, v in zip(METRIC_FIELDS, self.values):
+            yield f.display_name, _cast(f, v)
+
+    def display_items(self):
+        """按 Schema 顺序产出 (中文指标名, 展示文本)"""
+        for f, v in zip(METRIC_FIELDS, self.values):
+            yield f.display_name, format_value(f, v)
+
+    def to_dict(self) -> dict:
+        """编码为中文键字典 (本地 JSON 存档 / 剪贴板文本)"""
+        result = {
+            "账户ID": self.advertiser_id,
+            "账户名称": self.advertiser_name,
+            "开始日期": self.start_date,
+            "结束日期": self.end_date,
+        }
+        result.update(self.metric_items())
+        return result
+
+    def metric_values(self) -> list:
+        """按 Schema 顺序产出数值 (整数指标还原为 int)"""
+        return [_cast(f, v) for f, v in zip(METRIC_FIELDS, self.values)]
+
+    def to_row(self) -> list:
+        """编码为紧凑行：[账户ID, 账户名称, 开始日期, 结束日期, 指标1, 指标2, ...]"""
+        return [self.advertiser_id, self.advertiser_name, self.start_date, self.end_date, *self.metric_values()]
+
+    def to_feishu_fields(self, advertiser_name: str, start_ts: int, end_ts: int) -> dict:
+        """编码为飞书写入字段 (日期为毫秒时间戳，指标均为数字)"""
+        fields = {
+            "账户名称": advertiser_name,
+            "开始日期": start_ts,
+            "结束日期": end_ts
+        }
+        for f, v in zip(METRIC_FIELDS, self.values):
+            fields[f.display_name] = v
+        return fields
@@ -0,0 +1,92 @@
+import time
+import requests
+from src.auth.token_service import LoginRequiredError
+from src.data_query.schema import MetricRecord
+from src.utils.config import DAEMON_HOST, DAEMON_PORT, DAEMON_KEY
+from src.utils.scheduler import INTERACTIVE
+
+# 守护进程探活结果的缓存时长 (秒)，避免每次操作都探测一次
+PROBE_TTL = 30
+# 建立连接的超时 (秒)：连不上即视为守护进程未运行，调用方可回退到本地直连
+CONNECT_TIMEOUT = 3
+
+
+class DaemonClient:
+    """本地查询守护进程的轻量客户端；守护进程未运行时 is_available() 返回 False"""
+
+    def __init__(self, host: str = DAEMON_HOST, port: int = DAEMON_PORT, timeout: float = 60):
+        # 0.0.0.0 为监听地址，客户端连接本机即可
+        connect_host = "127.0.0.1" if host in ("0.0.0.0", "") else host
+        self.base_url = f"http://{connect_host}:{port}"
+        self.timeout = timeout
+        self.headers = {"X-RedAd-Key": DAEMON_KEY} if DAEMON_KEY else {}
+        self._available = None
+        self._checked_at = 0.0
+
+    def is_available(self) -> bool:
+        now = time.time()
+        if self._available is not None and now - self._checked_at < PROBE_TTL:
+            return self._available
+        try:
+            resp = requests.get(f"{self.base_url}/health", headers=self.headers, timeout=0.5)
+            self._available = resp.status_code == 200 and resp.json().get("ok", False)
+        except (requests.RequestException, ValueError):
+            self._available = False
+        self._checked_at = now
+        return self._available
+
+    def _post(self, path: str, payload: dict, wait: bool = False) -> dict:
+        """
+        wait=True 时不限制读取超时：非交互请求可能在服务端按优先级排队较久，
+        超时后回退直连会与服务端仍在排队的同一请求重复调用，并绕开共享的调用额度。
+        """
+        timeout = (CONNECT_TIMEOUT, None if wait else self.timeout)
+        try:
+            resp = requests.post(f"{self.base_url}{path}", json=payload, headers=self.headers, timeout=timeout)
+            return resp.json()
+        except (requests.RequestException, ValueError):
+            # 守护进程中途退出：下次调用重新探活并回退到本地直连
+            self._available = None
+            raise
+
+    def list_accounts(self) -> list:
+        """已授权账户列表 (仅展示字段，不含 Token)"""
+        try:
+            resp = requests.get(f"{self.base_url}/accounts", headers=self.headers, timeout=self.timeout)
+            res = resp.json()
+        except (requests.RequestException, ValueError):
+            self._available = None
+            raise
+        if res.get("code") != 0:
+            raise Exception(f"获取账户列表失败: {res.get('msg')}")
+        return res.get("accounts") or []
+
+    def fetch_report(self, advertiser_id, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                     page_size: int = 1, priority: int = INTERACTIVE) -> list:
+        res = self._post("/report", {
+            "advertiser_id": str(advertiser_id),
+            "start_date": start_date,
+            "end_date": end_date,
+            "time_unit": time_unit,
+            "page_size": page_size,
+            "priority": priority
+        }, wait=priority != INTERACTIVE)
+        if res.get("code") == 401:
+            raise LoginRequiredError(res.get("msg"))
+        if res.get("code") != 0:
+            raise Exception(f"API请求失败: {res.get('msg')}")
+        return res.get("data_list") or []
+
+    def sync_to_feishu(self, record: MetricRecord) -> bool:
+        res = self._post("/sync", {"record": record.to_row()})
+        return bool(res.get("ok"))
+
+    def sync_records(self, records: list) -> int:
+        """整批交给服务端并行写入飞书，返回成功 (含已存在) 条数"""
+        res = self._post("/sync_batch", {"records": [r.to_row() for r in records]}, wait=True)
+        if res.get("code") != 0:
+            raise Exception(f"飞书同步失败: {res.get('msg')}")
+        return int(res.get("ok") or 0)
+
+
+daemon_client = DaemonClient()
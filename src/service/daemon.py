@@ -0,0 +1,258 @@
+import os
+import json
+import ipaddress
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.auth.token_service import TokenManager, LoginRequiredError
+from src.data_query.data_query import submit_report
+from src.data_query.schema import MetricRecord
+from src.share.feishu_sync import feishu_client
+from src.share.feishu_writer import write_records
+from src.utils.config import DAEMON_HOST, DAEMON_PORT, DAEMON_KEY
+from src.utils.scheduler import scheduler, INTERACTIVE
+
+# ========================================================
+# 本地查询守护进程
+# 逻辑：常驻一个进程持有 TokenManager / FeishuSync / 报表缓存，
+#      通过本机 HTTP 接口为多个 main.py 客户端提供查询与同步服务；
+#      相同 (账户, 区间) 的并发请求只向聚光发起一次调用。
+# ========================================================
+
+# 有数据的报表缓存时长 (秒)；空结果 (数据尚未产出) 不缓存
+REPORT_CACHE_TTL = 600
+
+
+class SingleFlight:
+    """同 key 的并发调用合并为一次：首个调用者执行，其余等待并共享结果 (或异常)"""
+
+    class _Call:
+        __slots__ = ("event", "result", "error", "state")
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+            # 首个调用者与合并进来的调用者共享的上下文
+            self.state = {}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, join=None):
+        """
+        返回 (结果, 是否为合并的请求)。
+        首个调用者执行 fn(state)；合并进来的调用者在等待前先执行 join(state)，可借此调整进行中的调用。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            elif join is not None:
+                join(call.state)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(call.state)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class ReportService:
+    """守护进程内的共享状态：报表缓存、请求合并、飞书同步串行化与统计"""
+
+    def __init__(self, cache_ttl: int = REPORT_CACHE_TTL):
+        self.cache_ttl = cache_ttl
+        self.started_at = time.time()
+        self._flight = SingleFlight()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._sync_locks = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "upstream_calls": 0, "cache_hits": 0, "coalesced": 0, "syncs": 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get_report(self, advertiser_id: str, start_date: str, end_date: str, time_unit: str = "SUMMARY",
+                   page_size: int = 1, priority: int = INTERACTIVE) -> list:
+        key = (str(advertiser_id), start_date, end_date, time_unit, int(page_size))
+        self._count("requests")
+
+        now = time.time()
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] > now:
+                self._count("cache_hits")
+                return hit[1]
+
+        def upstream(state: dict):
+            self._count("upstream_calls")
+            state["priority"] = min(state.get("priority", priority), priority)
+            state["future"] = future = submit_report(advertiser_id, start_date, end_date, time_unit=time_unit,
+                                                     page_size=page_size, priority=state["priority"])
+            # 提交期间合并进来的更紧急请求：按其优先级提升排队中的调用
+            scheduler.promote(future, state["priority"])
+            data_list = future.result()
+            if data_list:
+                with self._cache_lock:
+                    self._cache[key] = (time.time() + self.cache_ttl, data_list)
+            return data_list
+
+        def join(state: dict):
+            # 合并到已在排队的请求上时，排队优先级取所有等待者中最紧急的一个
+            state["priority"] = min(state.get("priority", priority), priority)
+            if state.get("future") is not None:
+                scheduler.promote(state["future"], state["priority"])
+
+        data_list, coalesced = self._flight.do(key, upstream, join)
+        if coalesced:
+            self._count("coalesced")
+        return data_list
+
+    def _sync_lock(self, advertiser_id: str) -> threading.Lock:
+        with self._cache_lock:
+            return self._sync_locks.setdefault(advertiser_id, threading.Lock())
+
+    def sync(self, record: MetricRecord) -> bool:
+        # 同一账户的同步串行执行，避免并发建表 / 重复写入
+        with self._sync_lock(record.advertiser_id):
+            self._count("syncs")
+            return feishu_client.sync_to_feishu(record, record.advertiser_id, record.advertiser_name,
+                                                record.start_date, record.end_date)
+
+    def sync_batch(self, records: list) -> int:
+        # 持有涉及账户的同步锁 (按账户ID排序加锁，避免互相等待)，与逐条同步互斥
+        locks = [self._sync_lock(adv_id) for adv_id in sorted({r.advertiser_id for r in records})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            self._count("syncs")
+            return write_records(records)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def health(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        with self._cache_lock:
+            stats["cached_reports"] = len(self._cache)
+        return {"ok": True, "pid": os.getpid(), "uptime": int(time.time() - self.started_at), "stats": stats,
+                "scheduler": scheduler.stats()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: ReportService = None
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if DAEMON_KEY and self.headers.get("X-RedAd-Key") != DAEMON_KEY:
+            self._send(403, {"code": 403, "msg": "口令错误"})
+            return False
+        return True
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/health":
+            self._send(200, self.service.health())
+        elif self.path == "/accounts":
+            # 仅返回展示所需字段，不外泄 Token
+            accounts = [{k: t.get(k) for k in ("advertiser_id", "advertiser_name",
+                                               "access_expires_at", "refresh_expires_at")}
+                        for t in TokenManager.get_tokens()]
+            self._send(200, {"code": 0, "accounts": accounts})
+        else:
+            self._send(404, {"code": 404, "msg": "未知接口"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            body = self._read_body()
+            if self.path == "/report":
+                data_list = self.service.get_report(body["advertiser_id"], body["start_date"], body["end_date"],
+                                                    time_unit=body.get("time_unit", "SUMMARY"),
+                                                    page_size=body.get("page_size", 1),
+                                                    priority=int(body.get("priority", INTERACTIVE)))
+                self._send(200, {"code": 0, "data_list": data_list})
+            elif self.path == "/sync":
+                ok = self.service.sync(MetricRecord.from_row(body["record"]))
+                self._send(200, {"code": 0 if ok else 500, "ok": ok})
+            elif self.path == "/sync_batch":
+                ok = self.service.sync_batch([MetricRecord.from_row(row) for row in body["records"]])
+                self._send(200, {"code": 0, "ok": ok})
+            else:
+                self._send(404, {"code": 404, "msg": "未知接口"})
+        except LoginRequiredError as e:
+            self._send(200, {"code": 401, "msg": str(e)})
+        except (KeyError, ValueError) as e:
+            self._send(400, {"code": 400, "msg": f"请求参数错误: {e}"})
+        except Exception as e:
+            self._send(200, {"code": 500, "msg": str(e)})
+
+    def log_message(self, format, *args):
+        if getattr(self, "path", "") == "/health":
+            # 客户端探活请求较频繁，不打印
+            return
+        print(f"[{time.strftime('%H:%M:%S')}] {self.address_string()} {format % args}")
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(host: str = DAEMON_HOST, port: int = DAEMON_PORT):
+    """启动守护进程 (阻塞运行，Ctrl+C 退出)"""
+    if not _is_loopback(host) and not DAEMON_KEY:
+        # /report 与 /sync (写入飞书) 不能在无口令的情况下暴露到局域网
+        print(f"❌ 监听地址 {host} 不是本机地址，请先设置环境变量 REDAD_DAEMON_KEY 作为访问口令。")
+        return
+    service = ReportService()
+    handler = type("ReportHandler", (_Handler,), {"service": service})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"❌ 无法监听 {host}:{port} ({e})，可能已有守护进程在运行。")
+        return
+
+    server.daemon_threads = True
+    print(f"🛰️ 本地查询服务已启动: http://{host}:{port} (Ctrl+C 停止)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("\n🛑 本地查询服务已停止。")
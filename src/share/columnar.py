@@ -0,0 +1,189 @@
+import os
+import time
+import datetime
+import tempfile
+from pathlib import Path
+from src.utils.config import DATA_DOWNLOAD_DIR
+from src.data_query.schema import METRIC_FIELDS
+from src.data_query.history import iter_local_records
+from src.auth.accounts import prompt_accounts
+
+# ========================================================
+# 列式导出 (供 pandas / DuckDB / BI 工具分析)
+# 逻辑：把本地全部报表记录 (查询存档 + 归档 + 回填) 按列写入 Arrow IPC 或 Parquet 文件，
+#      列名使用聚光接口的英文字段名，计数类指标为 int64、金额/比率为 float64，日期为 date32，
+#      中文展示名保存在字段元数据中。Arrow IPC 文件不压缩，读取时可直接内存映射、零拷贝加载。
+# pyarrow 为可选依赖，仅导出 / 加载时需要。
+# ========================================================
+
+COLUMNAR_DIR = DATA_DOWNLOAD_DIR / 'columnar'
+# 每累计多少行写出一个批次，控制导出时的内存占用
+BATCH_ROWS = 65536
+
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# 元数据列：(列名, 中文展示名)
+META_COLUMNS = (
+    ("advertiser_id", "账户ID"),
+    ("advertiser_name", "账户名称"),
+    ("start_date", "开始日期"),
+    ("end_date", "结束日期"),
+)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("列式导出需要 pyarrow，请先执行: pip install pyarrow")
+    return pyarrow
+
+
+def arrow_schema():
+    """由 Schema 注册表派生 Arrow 表结构"""
+    pa = _require_pyarrow()
+    meta_types = (pa.string(), pa.string(), pa.date32(), pa.date32())
+    fields = [pa.field(name, dtype, metadata={"display_name": display})
+              for (name, display), dtype in zip(META_COLUMNS, meta_types)]
+    for f in METRIC_FIELDS:
+        dtype = pa.int64() if f.dtype is int else pa.float64()
+        fields.append(pa.field(f.api_name, dtype, metadata={"display_name": f.display_name}))
+    return pa.schema(fields)
+
+
+def _to_date(s: str):
+    try:
+        return datetime.datetime.strptime(s, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_export_records(advertiser_ids=None, start_date: str = None, end_date: str = None):
+    """
+    按 账户 / 日期区间 过滤本地记录 (记录周期完全落在区间内才保留)。
+    同一账户同一周期有多份记录时只保留一份：查询存档按查询时间倒序排列，即保留最新一次查询。
+    """
+    ids = {str(i) for i in advertiser_ids} if advertiser_ids else None
+    seen = set()
+    for record in iter_local_records():
+        if ids is not None and record.advertiser_id not in ids:
+            continue
+        if start_date and record.start_date < start_date:
+            continue
+        if end_date and record.end_date > end_date:
+            continue
+        key = (record.advertiser_id, record.start_date, record.end_date)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield record
+
+
+def _record_batches(records, schema):
+    pa = _require_pyarrow()
+    columns = [[] for _ in schema]
+    meta_count = len(META_COLUMNS)
+
+    def flush():
+        batch = pa.record_batch([pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                                schema=schema)
+        for col in columns:
+            col.clear()
+        return batch
+
+    for r in records:
+        columns[0].append(r.advertiser_id)
+        columns[1].append(r.advertiser_name)
+        columns[2].append(_to_date(r.start_date))
+        columns[3].append(_to_date(r.end_date))
+        for i, v in enumerate(r.metric_values(), meta_count):
+            columns[i].append(v)
+        if len(columns[0]) >= BATCH_ROWS:
+            yield flush()
+    if columns[0]:
+        yield flush()
+
+
+def export_columnar(path: Path, fmt: str = "arrow", advertiser_ids=None, start_date: str = None,
+                    end_date: str = None) -> int:
+    """
+    导出为列式文件，返回写入行数。
+    先写入同目录临时文件，完成后再替换目标文件，导出中断不会留下半个文件。
+    """
+    pa = _require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = arrow_schema()
+    records = iter_export_records(advertiser_ids, start_date, end_date)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=str(path.parent))
+    os.close(fd)
+    rows = 0
+    try:
+        if fmt == "arrow":
+            writer = pa.ipc.new_file(tmp_path, schema)
+        else:
+            writer = pa.parquet.ParquetWriter(tmp_path, schema, compression="zstd")
+        with writer:
+            for batch in _record_batches(records, schema):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return rows
+
+
+def load_columnar(path: Path):
+    """
+    加载导出文件，返回 pyarrow.Table (可继续 .to_pandas() 或交给 DuckDB 查询)。
+    Arrow IPC 文件通过内存映射读取，数据列直接引用映射内存，不做拷贝。
+    """
+    pa = _require_pyarrow()
+    path = Path(path)
+    if path.suffix == FORMATS["parquet"]:
+        return pa.parquet.read_table(path, memory_map=True)
+    source = pa.memory_map(str(path), 'r')
+    return pa.ipc.open_file(source).read_all()
+
+
+def export_flow():
+    """列式导出交互流程：选择账户范围 -> 日期区间 -> 导出格式"""
+    try:
+        _require_pyarrow()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return
+
+    scope = input("\n导出范围：回车导出全部账户，输入 s 选择账户/分组: ").strip().lower()
+    advertiser_ids = None
+    if scope == 's':
+        accounts = prompt_accounts()
+        if not accounts:
+            return
+        advertiser_ids = [a['advertiser_id'] for a in accounts]
+
+    start_date = input("起始日期 (YYYY-MM-DD，回车不限): ").strip() or None
+    end_date = input("结束日期 (YYYY-MM-DD，回车不限): ").strip() or None
+    for d in (start_date, end_date):
+        if d and _to_date(d) is None:
+            print("❌ 日期格式错误")
+            return
+
+    fmt = "parquet" if input("导出格式 1. Arrow (默认，加载最快)  2. Parquet (体积更小): ").strip() == '2' else "arrow"
+    path = COLUMNAR_DIR / f"report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{FORMATS[fmt]}"
+
+    print("⏳ 正在导出...")
+    t0 = time.monotonic()
+    rows = export_columnar(path, fmt, advertiser_ids, start_date, end_date)
+    print(f"✅ 已导出 {rows} 行，用时 {time.monotonic() - t0:.1f} 秒")
+    print(f"📁 文件位置: {path}")
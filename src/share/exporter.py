@@ -1,22 +1,46 @@
 import json
 import datetime
 import pyperclip
+from pathlib import Path
 from src.utils.config import DATA_DOWNLOAD_DIR
+from src.data_query.schema import format_metric
 
 
-def save_report(metrics: dict, name: str, start: str, end: str):
-    """保存 JSON 并复制到剪贴板"""
+def parse_filename(filename: str):
+    """解析 save_report 生成的文件名：账户名_开始日期_结束日期_查询日期_查询时分.json"""
+    try:
+        stem = Path(filename).stem
+        parts = stem.split('_')
+        if len(parts) >= 5:
+            query_time = f"{parts[-2]} {parts[-1].replace('.', ':')}"
+            end_date = parts[-3]
+            start_date = parts[-4]
+            account_name = "_".join(parts[:-4])
+            return {
+                "name": account_name,
+                "range": f"{start_date} -> {end_date}",
+                "time": query_time,
+                "file": filename
+            }
+    except Exception:
+        pass
+    return None
+
+
+def save_report(metrics: dict, name: str, start: str, end: str, copy: bool = True):
+    """保存 JSON 并复制到剪贴板 (批量任务传 copy=False 跳过剪贴板)；文件保存数值，剪贴板为展示文本"""
 
     # 1. 准备文本内容
     text_content = f"⭐ {name} ⭐聚光数据\n🎉数据周期: {start} 至 {end}\n\n"
-    text_content += "\n".join([f"{k}: {v}" for k, v in metrics.items()])
+    text_content += "\n".join([f"{k}: {format_metric(k, v)}" for k, v in metrics.items()])
 
     # 2. 复制到剪贴板
-    try:
-        pyperclip.copy(text_content)
-        print("\n📋 数据已复制到剪贴板！(可直接粘贴发送)")
-    except Exception:
-        pass
+    if copy:
+        try:
+            pyperclip.copy(text_content)
+            print("\n📋 数据已复制到剪贴板！(可直接粘贴发送)")
+        except Exception:
+            pass
 
     # 3. 保存文件
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
@@ -0,0 +1,191 @@
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.data_query.history import iter_local_records
+from src.data_query.schema import METRIC_FIELDS
+from src.share.feishu_sync import feishu_client, field_text
+from src.utils.config import DATA_DOWNLOAD_DIR
+from src.utils.rate_limit import RateLimiter
+from src.utils.storage import read_json, write_json_atomic
+
+# ========================================================
+# 飞书全表镜像与对账
+# 逻辑：按 account_mapping 并发拉取每张数据表的全部记录，存为本地快照 (多个账户共用的数据表只拉取一次)；
+#      以数据表 revision 作为变更标记，未变更的表直接复用上次快照 (增量)；
+#      随后按 (账户名称, 开始日期, 结束日期) 与本地历史数据逐条比对，输出 缺失 / 多余 / 不一致 的记录。
+# ========================================================
+
+MIRROR_DIR = DATA_DOWNLOAD_DIR / 'feishu_mirror'
+REPORT_PATH = MIRROR_DIR / 'reconcile_report.json'
+
+DEFAULT_WORKERS = 8
+# 飞书多维表格接口调用频率上限 (次/秒)，所有并发线程共享
+DEFAULT_RATE = 10.0
+# 数值比对容差 (飞书数字字段存在浮点精度差异)
+TOLERANCE = 1e-6
+
+
+def _ts_to_date(value) -> str:
+    """飞书日期字段 (毫秒时间戳) -> YYYY-MM-DD"""
+    try:
+        return datetime.datetime.fromtimestamp(int(value) / 1000).strftime("%Y-%m-%d")
+    except (TypeError, ValueError, OSError):
+        return ""
+
+
+class FeishuMirror:
+    def __init__(self, workers: int = DEFAULT_WORKERS, rate: float = DEFAULT_RATE):
+        self.workers = max(1, int(workers))
+        self.limiter = RateLimiter(rate, burst=self.workers)
+
+    def targets(self) -> list:
+        """由 account_mapping 得到需要镜像的 (账户ID, 账户名, app_token, table_id)"""
+        config = feishu_client.main_config
+        default_app_token = config.get("default_app_token")
+        result = []
+        for adv_id, conf in (config.get("account_mapping") or {}).items():
+            app_token = conf.get("app_token") or default_app_token
+            if conf.get("table_id") and app_token:
+                result.append((str(adv_id), conf.get("name_remark", ""), app_token, conf["table_id"]))
+        return result
+
+    def table_revisions(self, app_token: str) -> dict:
+        """获取整个多维表格下各数据表的 revision (变更标记)"""
+        return {t["table_id"]: t.get("revision")
+                for t in feishu_client.list_tables(app_token, before_page=self.limiter.acquire)}
+
+    @staticmethod
+    def snapshot_path(app_token: str, table_id: str):
+        return MIRROR_DIR / f"{app_token}_{table_id}.json"
+
+    def _mirror_table(self, app_token: str, table_id: str, revision) -> dict:
+        records = {item["record_id"]: item.get("fields", {})
+                   for item in feishu_client.list_records(app_token, table_id, before_page=self.limiter.acquire)}
+        snapshot = {"revision": revision, "synced_at": int(time.time()), "records": records}
+        write_json_atomic(self.snapshot_path(app_token, table_id), snapshot, compact=True)
+        return snapshot
+
+    def mirror(self) -> dict:
+        """
+        拉取全部映射表，返回 {账户ID: 快照}。
+        revision 与上次快照一致的表跳过拉取；无法获取 revision 时按全量拉取。
+        """
+        MIRROR_DIR.mkdir(parents=True, exist_ok=True)
+        targets = self.targets()
+
+        revisions = {}
+        for app_token in {t[2] for t in targets}:
+            try:
+                revisions[app_token] = self.table_revisions(app_token)
+            except Exception as e:
+                print(f"⚠️ 获取 {app_token} 的数据表列表失败，将全量拉取: {e}")
+                revisions[app_token] = {}
+
+        # 多个账户可映射到同一张数据表：每张表只拉取一次，快照由这些账户共用
+        tables = {}
+        for adv_id, name, app_token, table_id in targets:
+            tables.setdefault((app_token, table_id), []).append((adv_id, name))
+
+        snapshots, jobs = {}, {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for (app_token, table_id), accounts in tables.items():
+                revision = revisions[app_token].get(table_id)
+                cached = read_json(self.snapshot_path(app_token, table_id), None)
+                if cached and revision is not None and cached.get("revision") == revision:
+                    snapshots.update((adv_id, cached) for adv_id, _ in accounts)
+                    continue
+                jobs[pool.submit(self._mirror_table, app_token, table_id, revision)] = accounts
+
+            for fut in as_completed(jobs):
+                accounts = jobs[fut]
+                try:
+                    snapshot = fut.result()
+                except Exception as e:
+                    print(f"❌ [{'、'.join(name for _, name in accounts)}] 镜像失败: {e}")
+                    continue
+                snapshots.update((adv_id, snapshot) for adv_id, _ in accounts)
+
+        print(f"🪞 镜像完成：{len(tables)} 张表，其中 {len(jobs)} 张有变更已重新拉取，"
+              f"{len(tables) - len(jobs)} 张未变更，耗时 {time.monotonic() - started:.1f} 秒")
+        return snapshots
+
+
+def reconcile(snapshots: dict, local_records) -> dict:
+    """
+    对比飞书快照与本地记录，键为 (账户名称, 开始日期, 结束日期)。
+    多个账户可共用一张数据表，飞书记录按行内的账户名称归属，与写入时的查重键一致。
+    只比对已建立映射的账户；本地同键多条时以先出现者 (最新查询) 为准。
+    """
+    local = {}
+    for r in local_records:
+        if r.advertiser_id in snapshots:
+            local.setdefault((r.advertiser_name, r.start_date, r.end_date), r)
+
+    # 共用数据表的账户指向同一份快照，只遍历一次
+    unique = {id(snap): snap for snap in snapshots.values()}
+    remote, duplicates = {}, []
+    for snap in unique.values():
+        for record_id, fields in snap.get("records", {}).items():
+            key = (field_text(fields.get("账户名称")),
+                   _ts_to_date(fields.get("开始日期")), _ts_to_date(fields.get("结束日期")))
+            if key in remote:
+                duplicates.append({"key": list(key), "record_id": record_id})
+                continue
+            remote[key] = (record_id, fields)
+
+    missing = [list(k) for k in local if k not in remote]
+    extra = [list(k) + [remote[k][0]] for k in remote if k not in local]
+    different = []
+    for key, r in local.items():
+        if key not in remote:
+            continue
+        record_id, fields = remote[key]
+        diffs = {}
+        for f, v in zip(METRIC_FIELDS, r.values):
+            remote_v = fields.get(f.display_name)
+            remote_v = float(remote_v) if isinstance(remote_v, (int, float)) else 0.0
+            if abs(remote_v - v) > TOLERANCE * max(1.0, abs(v)):
+                diffs[f.display_name] = {"local": v, "feishu": remote_v}
+        if diffs:
+            different.append({"key": list(key), "record_id": record_id, "fields": diffs})
+
+    return {
+        "generated_at": int(time.time()),
+        "local_count": len(local),
+        "feishu_count": len(remote),
+        "missing": sorted(missing),
+        "extra": sorted(extra),
+        "different": different,
+        "duplicates": duplicates
+    }
+
+
+def mirror_flow():
+    """对账交互流程：镜像飞书数据 -> 与本地历史比对 -> 输出报告"""
+    if not feishu_client.main_config:
+        print("❌ 未配置飞书应用信息 (feishu_config.json)")
+        return
+
+    mirror = FeishuMirror()
+    if not mirror.targets():
+        print("⚠️ account_mapping 为空，暂无可对账的飞书数据表。")
+        return
+
+    snapshots = mirror.mirror()
+    report = reconcile(snapshots, iter_local_records())
+    write_json_atomic(REPORT_PATH, report)
+
+    print("\n" + "=" * 60)
+    print(f"本地记录 {report['local_count']} 条 | 飞书记录 {report['feishu_count']} 条")
+    print(f"🔴 飞书缺失: {len(report['missing'])} 条")
+    print(f"🟡 飞书多出 (本地无记录): {len(report['extra'])} 条")
+    print(f"🟠 数值不一致: {len(report['different'])} 条")
+    print(f"⚪ 飞书重复记录: {len(report['duplicates'])} 条")
+    print("=" * 60)
+    for name, start, end in report['missing'][:20]:
+        print(f"  缺失: {name} {start} ~ {end}")
+    for item in report['different'][:20]:
+        name, start, end = item['key']
+        print(f"  不一致: {name} {start} ~ {end} -> {', '.join(item['fields'])}")
+    print(f"\n📄 完整对账报告: {REPORT_PATH.resolve()}")
@@ -1,9 +1,19 @@
-import requests
 import json
 import time
+import asyncio
 import datetime
-from typing import Dict, Optional, List, Any
-from src.utils.config import load_feishu_config, FEISHU_CONFIG_PATH, save_json
+from typing import Callable, Dict, Optional, Union
+from src.utils.config import load_feishu_config, save_json, FEISHU_CONFIG_PATH, FEISHU_TOKEN_CACHE_PATH
+from src.utils.storage import update_json, file_lock, read_json
+from src.data_query.schema import MetricRecord, FEISHU_TABLE_FIELDS
+from src.utils.aio import get_session, run_sync
+
+
+def field_text(value) -> str:
+    """飞书文本字段取值：接口可能返回字符串，也可能返回 [{"type": "text", "text": ...}] 分段列表"""
+    if isinstance(value, list):
+        return "".join(seg.get("text", "") if isinstance(seg, dict) else str(seg) for seg in value)
+    return "" if value is None else str(value)
 
 
 class FeishuSync:
@@ -12,8 +22,34 @@ class FeishuSync:
         self.tenant_access_token = None
         self.token_expire_time = 0
 
-    def _get_token(self) -> str:
-        """获取或刷新飞书 Tenant Access Token"""
+    def _load_cached_token(self, now: float) -> str:
+        """读取本地缓存的 Tenant Token (需属于当前 app_id 且未临近过期)"""
+        cache = read_json(FEISHU_TOKEN_CACHE_PATH, {})
+        if (cache.get("app_id") == self.main_config.get("app_id") and cache.get("tenant_access_token")
+                and now < cache.get("expire_at", 0)):
+            self.tenant_access_token = cache["tenant_access_token"]
+            self.token_expire_time = cache["expire_at"]
+            return self.tenant_access_token
+        return ""
+
+    async def _request_tenant_token_async(self) -> dict:
+        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+        payload = {
+            "app_id": self.main_config.get("app_id"),
+            "app_secret": self.main_config.get("app_secret")
+        }
+        session = await get_session()
+        async with session.post(url, json=payload) as resp:
+            return await resp.json(content_type=None)
+
+    async def _get_token_async(self) -> str:
+        """get_token 的异步版本：内存命中直接返回，否则在线程中走 缓存 / 加锁刷新 流程"""
+        if self.tenant_access_token and time.time() < self.token_expire_time:
+            return self.tenant_access_token
+        return await asyncio.to_thread(self.get_token)
+
+    def get_token(self) -> str:
+        """获取或刷新飞书 Tenant Access Token (内存 -> 本地缓存 -> 飞书接口)"""
         if not self.main_config:
             return ""
 
@@ -22,45 +58,35 @@ class FeishuSync:
         if self.tenant_access_token and now < self.token_expire_time:
             return self.tenant_access_token
 
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        payload = {
-            "app_id": self.main_config.get("app_id"),
-            "app_secret": self.main_config.get("app_secret")
-        }
+        # 其他进程 / 上一次运行获取的 Token 仍有效则直接复用，省去一次鉴权请求
+        if self._load_cached_token(now):
+            return self.tenant_access_token
 
-        try:
-            resp = requests.post(url, json=payload)
-            data = resp.json()
-            if data.get("code") == 0:
-                self.tenant_access_token = data.get("tenant_access_token")
-                self.token_expire_time = now + data.get("expire", 7200) - 300
+        # 加锁后再检查一次，保证并发进程只有一个真正去请求飞书
+        with file_lock(FEISHU_TOKEN_CACHE_PATH):
+            now = time.time()
+            if self._load_cached_token(now):
                 return self.tenant_access_token
-            else:
-                print(f"❌ 飞书鉴权失败: {data.get('msg')}")
-                return ""
-        except Exception as e:
-            print(f"❌ 连接飞书失败: {e}")
-            return ""
 
-    def _clean_number(self, value: Any) -> float:
-        """数据清洗：将各种格式的数值统一转换为 float"""
-        if value is None: return 0.0
-        if isinstance(value, (int, float)): return float(value)
-        if isinstance(value, str):
-            s = value.strip().replace(',', '')
-            if '%' in s:
-                try:
-                    return float(s.replace('%', '')) / 100.0
-                except:
-                    return 0.0
-            if s in ['-', 'N/A', 'nan', 'null', '']: return 0.0
             try:
-                return float(s)
-            except:
-                return 0.0
-        return 0.0
+                data = run_sync(self._request_tenant_token_async())
+                if data.get("code") == 0:
+                    self.tenant_access_token = data.get("tenant_access_token")
+                    self.token_expire_time = now + data.get("expire", 7200) - 300
+                    save_json(FEISHU_TOKEN_CACHE_PATH, {
+                        "app_id": self.main_config.get("app_id"),
+                        "tenant_access_token": self.tenant_access_token,
+                        "expire_at": self.token_expire_time
+                    }, compact=True)
+                    return self.tenant_access_token
+                else:
+                    print(f"❌ 飞书鉴权失败: {data.get('msg')}")
+                    return ""
+            except Exception as e:
+                print(f"❌ 连接飞书失败: {e}")
+                return ""
 
-    def _date_to_timestamp(self, date_str: str) -> int:
+    def date_to_timestamp(self, date_str: str) -> int:
         """日期标准化：统一转换为毫秒级时间戳"""
         try:
             date_s = str(date_str).strip()
@@ -79,20 +105,21 @@ class FeishuSync:
         except Exception:
             return int(time.time() * 1000)
 
-    def _find_existing_table_id(self, app_token: str, advertiser_name: str, advertiser_id: str) -> Optional[str]:
+    async def _find_existing_table_id_async(self, app_token: str, advertiser_name: str, advertiser_id: str) -> Optional[str]:
         """
         [云端发现升级]
         优先查找: 账户名_账户ID (精准匹配)
         兜底查找: 账户名_ (前缀匹配，兼容旧版)
         """
         try:
-            token = self._get_token()
+            token = await self._get_token_async()
             url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables"
             headers = {"Authorization": f"Bearer {token}"}
 
             params = {"page_size": 100}
-            resp = requests.get(url, headers=headers, params=params)
-            res = resp.json()
+            session = await get_session()
+            async with session.get(url, headers=headers, params=params) as resp:
+                res = await resp.json(content_type=None)
 
             if res.get("code") != 0:
                 return None
@@ -121,6 +148,27 @@ class FeishuSync:
             print(f"⚠️ 云端查找表格失败: {e}")
             return None
 
+    def _find_existing_table_id(self, app_token: str, advertiser_name: str, advertiser_id: str) -> Optional[str]:
+        """_find_existing_table_id_async 的同步包装"""
+        return run_sync(self._find_existing_table_id_async(app_token, advertiser_name, advertiser_id))
+
+    async def _create_table_async(self, app_token: str, table_name: str) -> dict:
+        """按 Schema 注册表的字段定义创建数据表，返回飞书接口原始响应"""
+        token = await self._get_token_async()
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables"
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+        payload = {
+            "table": {
+                "name": table_name,
+                "default_view_name": "默认视图",
+                "fields": FEISHU_TABLE_FIELDS
+            }
+        }
+        session = await get_session()
+        async with session.post(url, headers=headers, json=payload) as resp:
+            return await resp.json(content_type=None)
+
     def _create_table_and_update_config(self, app_token: str, advertiser_id: str, advertiser_name: str) -> Optional[
         str]:
         """创建新表"""
@@ -132,7 +180,7 @@ class FeishuSync:
             return existing_table_id
 
         # 2. 新建表格逻辑
-        token = self._get_token()
+        token = self.get_token()
         if not token: return None
 
         clean_name = "".join(c for c in advertiser_name if c.isalnum())
@@ -147,41 +195,8 @@ class FeishuSync:
 
         print(f"🔨 正在创建新表: {table_name} ...")
 
-        fields_payload = [
-            {"field_name": "账户名称", "type": 1},
-            {"field_name": "开始日期", "type": 5},
-            {"field_name": "结束日期", "type": 5},
-            {"field_name": "消费", "type": 2},
-            {"field_name": "展现量", "type": 2},
-            {"field_name": "点击量", "type": 2},
-            {"field_name": "点击率", "type": 2},
-            {"field_name": "平均点击成本", "type": 2},
-            {"field_name": "平均千次展现费用", "type": 2},
-            {"field_name": "互动量", "type": 2},
-            {"field_name": "私信进线数", "type": 2},
-            {"field_name": "私信进线成本", "type": 2},
-            {"field_name": "私信留资数", "type": 2},
-            {"field_name": "私信留资成本", "type": 2},
-            {"field_name": "私信开口数", "type": 2},
-            {"field_name": "私信开口条数", "type": 2},
-            {"field_name": "私信开口成本", "type": 2},
-            {"field_name": "平均响应时长(分)", "type": 2}
-        ]
-
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables"
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-        payload = {
-            "table": {
-                "name": table_name,
-                "default_view_name": "默认视图",
-                "fields": fields_payload
-            }
-        }
-
         try:
-            resp = requests.post(url, headers=headers, json=payload)
-            res_json = resp.json()
+            res_json = run_sync(self._create_table_async(app_token, table_name))
 
             if res_json.get("code") == 0:
                 new_table_id = res_json["data"]["table_id"]
@@ -197,23 +212,25 @@ class FeishuSync:
 
     def _update_local_config(self, advertiser_id: str, advertiser_name: str, table_id: str):
         """更新本地配置文件"""
-        try:
-            current_config = load_feishu_config()
+        def mutate(current_config: dict):
             if "account_mapping" not in current_config:
                 current_config["account_mapping"] = {}
             current_config["account_mapping"][str(advertiser_id)] = {
                 "name_remark": advertiser_name,
                 "table_id": table_id
             }
-            save_json(FEISHU_CONFIG_PATH, current_config)
-            self.main_config = current_config
+
+        try:
+            # 加锁读-改-写，避免并发进程互相覆盖 account_mapping
+            self.main_config = update_json(FEISHU_CONFIG_PATH, mutate)
         except Exception as e:
             print(f"⚠️ 配置更新失败: {e}")
 
-    def _check_duplicate(self, app_token: str, table_id: str, acc_name: str, start_ts: int, end_ts: int) -> bool:
+    async def _check_duplicate_async(self, app_token: str, table_id: str, acc_name: str, start_ts: int,
+                                     end_ts: int) -> bool:
         """幂等性检查"""
         try:
-            token = self._get_token()
+            token = await self._get_token_async()
             url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records"
 
             filter_str = f'CurrentValue.[账户名称] = "{acc_name}"'
@@ -224,8 +241,9 @@ class FeishuSync:
             }
 
             headers = {"Authorization": f"Bearer {token}"}
-            resp = requests.get(url, headers=headers, params=params)
-            res = resp.json()
+            session = await get_session()
+            async with session.get(url, headers=headers, params=params) as resp:
+                res = await resp.json(content_type=None)
 
             if res.get("code") == 0 and res.get("data") and res.get("data").get("items"):
                 items = res["data"]["items"]
@@ -238,36 +256,142 @@ class FeishuSync:
         except Exception as e:
             return False
 
-    def sync_to_feishu(self, metrics: Dict, advertiser_id: str, advertiser_name: str, start_date: str, end_date: str,
-                       retry_count=0):
-        """核心同步逻辑"""
-        mapping = self.main_config.get("account_mapping", {})
-        target = mapping.get(str(advertiser_id))
-        default_app_token = self.main_config.get("default_app_token")
+    def _check_duplicate(self, app_token: str, table_id: str, acc_name: str, start_ts: int, end_ts: int) -> bool:
+        """_check_duplicate_async 的同步包装"""
+        return run_sync(self._check_duplicate_async(app_token, table_id, acc_name, start_ts, end_ts))
 
-        target_conf = None
+    async def _create_record_async(self, app_token: str, table_id: str, fields: dict) -> dict:
+        """写入单条记录，返回飞书接口原始响应"""
+        token = await self._get_token_async()
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records"
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        session = await get_session()
+        async with session.post(url, headers=headers, json={"fields": fields}) as resp:
+            return await resp.json(content_type=None)
+
+    def _create_record(self, app_token: str, table_id: str, fields: dict) -> dict:
+        """_create_record_async 的同步包装"""
+        return run_sync(self._create_record_async(app_token, table_id, fields))
+
+    async def _list_page_async(self, url: str, params: dict, page_token: str = None) -> tuple:
+        """读取分页接口的一页，返回 (items, 下一页 page_token 或 None)"""
+        token = await self._get_token_async()
+        headers = {"Authorization": f"Bearer {token}"}
+        query = dict(params)
+        if page_token:
+            query["page_token"] = page_token
+        session = await get_session()
+        async with session.get(url, headers=headers, params=query) as resp:
+            res = await resp.json(content_type=None)
+        if res.get("code") != 0:
+            raise Exception(f"飞书接口错误: {res.get('msg')}")
+
+        data = res.get("data") or {}
+        return data.get("items") or [], data.get("page_token") if data.get("has_more") else None
+
+    def _paginate(self, url: str, params: dict, before_page: Callable[[], None] = None):
+        """
+        逐页读取并逐条产出 items。
+        before_page 在每次请求前调用 (如限流器的 acquire)，使大表的每一页都计入调用额度。
+        """
+        page_token = None
+        while True:
+            if before_page:
+                before_page()
+            items, page_token = run_sync(self._list_page_async(url, params, page_token))
+            yield from items
+            if not page_token:
+                return
 
+    def list_tables(self, app_token: str, before_page: Callable[[], None] = None) -> list:
+        """多维表格下的全部数据表 (含 table_id / name / revision)"""
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables"
+        return list(self._paginate(url, {"page_size": 100}, before_page))
+
+    def list_records(self, app_token: str, table_id: str, field_names: list = None,
+                     before_page: Callable[[], None] = None):
+        """分页读取数据表记录，逐条产出 {"record_id", "fields"}；field_names 为空时返回全部字段"""
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records"
+        params = {"page_size": 500}
+        if field_names:
+            params["field_names"] = json.dumps(field_names, ensure_ascii=False)
+        return self._paginate(url, params, before_page)
+
+    def list_periods(self, app_token: str, table_id: str, before_page: Callable[[], None] = None) -> set:
+        """
+        读取数据表中已有记录的 (账户名称, 开始日期, 结束日期)，用于批量写入前的整表查重。
+        多个账户可映射到同一张数据表，因此查重键与 _check_duplicate 一样包含账户名称。
+        """
+        periods = set()
+        for item in self.list_records(app_token, table_id, ["账户名称", "开始日期", "结束日期"], before_page):
+            fields = item.get("fields", {})
+            periods.add((field_text(fields.get("账户名称")), fields.get("开始日期"), fields.get("结束日期")))
+        return periods
+
+    async def _batch_create_records_async(self, app_token: str, table_id: str, fields_list: list) -> dict:
+        """批量写入 (单次最多 500 条)，返回飞书接口原始响应"""
+        token = await self._get_token_async()
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_create"
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        payload = {"records": [{"fields": f} for f in fields_list]}
+        session = await get_session()
+        async with session.post(url, headers=headers, json=payload) as resp:
+            return await resp.json(content_type=None)
+
+    def batch_create_records(self, app_token: str, table_id: str, fields_list: list) -> dict:
+        """_batch_create_records_async 的同步包装"""
+        return run_sync(self._batch_create_records_async(app_token, table_id, fields_list))
+
+    def mapped_target(self, advertiser_id: str) -> Optional[dict]:
+        """account_mapping 中已配置的 {"app_token", "table_id"} (仅读本地配置，不发起请求)"""
+        target = self.main_config.get("account_mapping", {}).get(str(advertiser_id))
+        if target and target.get("table_id"):
+            return {"app_token": target.get("app_token") or self.main_config.get("default_app_token"),
+                    "table_id": target["table_id"]}
+        return None
+
+    def target_base(self, advertiser_id: str) -> Optional[str]:
+        """账户数据写入的多维表格 app_token：已配置的映射，否则为默认多维表格"""
+        target = self.mapped_target(advertiser_id)
+        return target["app_token"] if target else self.main_config.get("default_app_token")
+
+    def resolve_target(self, advertiser_id: str, advertiser_name: str, refresh: bool = False) -> Optional[dict]:
+        """
+        确定账户数据写入的 {"app_token", "table_id"}。
+        优先使用 account_mapping 中的配置；无配置 (或 refresh=True 要求重建) 时在默认多维表格中云端发现或新建。
+        """
         # 1. 尝试使用本地配置
-        if target and target.get("table_id") and retry_count == 0:
-            target_conf = {"app_token": target.get("app_token") or default_app_token, "table_id": target["table_id"]}
-        else:
-            # 2. 本地无配置，尝试云端发现或新建
-            if not default_app_token:
-                print("❌ 缺少 default_app_token，无法处理")
-                return
+        target = self.mapped_target(advertiser_id)
+        if target and not refresh:
+            return target
 
-            # 传入 advertiser_id 供命名使用
-            new_or_found_id = self._create_table_and_update_config(default_app_token, advertiser_id, advertiser_name)
-            if new_or_found_id:
-                target_conf = {"app_token": default_app_token, "table_id": new_or_found_id}
-            else:
-                return
+        # 2. 本地无配置，尝试云端发现或新建
+        default_app_token = self.main_config.get("default_app_token")
+        if not default_app_token:
+            print("❌ 缺少 default_app_token，无法处理")
+            return None
+
+        # 传入 advertiser_id 供命名使用
+        new_or_found_id = self._create_table_and_update_config(default_app_token, advertiser_id, advertiser_name)
+        if new_or_found_id:
+            return {"app_token": default_app_token, "table_id": new_or_found_id}
+        return None
 
-        token = self._get_token()
-        if not token: return
+    def sync_to_feishu(self, metrics: Union[Dict, MetricRecord], advertiser_id: str, advertiser_name: str,
+                       start_date: str, end_date: str, retry_count=0) -> bool:
+        """
+        核心同步逻辑 (metrics 可为 MetricRecord 或历史存档的中文键字典)。
+        写入成功或飞书中已存在该记录时返回 True。
+        """
+        target_conf = self.resolve_target(advertiser_id, advertiser_name, refresh=retry_count > 0)
+        if not target_conf:
+            return False
 
-        ts_start = self._date_to_timestamp(start_date)
-        ts_end = self._date_to_timestamp(end_date)
+        token = self.get_token()
+        if not token: return False
+
+        ts_start = self.date_to_timestamp(start_date)
+        ts_end = self.date_to_timestamp(end_date)
 
         # 3. 查重
         if retry_count == 0:
@@ -277,32 +401,18 @@ class FeishuSync:
             if is_dup:
                 print(f"⚠️ [重复拦截] 该账户在 {start_date} 至 {end_date} 的数据已存在于飞书。")
                 print("⏭️ 已自动跳过同步，无需重复操作。")
-                return
+                return True
 
         # 4. 写入
-        record_fields = {
-            "账户名称": advertiser_name,
-            "开始日期": ts_start,
-            "结束日期": ts_end
-        }
-        number_keys = [
-            "消费", "展现量", "点击量", "点击率", "平均点击成本", "平均千次展现费用",
-            "互动量", "私信进线数", "私信进线成本", "私信留资数", "私信留资成本",
-            "私信开口数", "私信开口条数", "私信开口成本", "平均响应时长(分)"
-        ]
-        for key in number_keys:
-            record_fields[key] = self._clean_number(metrics.get(key, 0))
-
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{target_conf['app_token']}/tables/{target_conf['table_id']}/records"
-        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        payload = {"fields": record_fields}
+        record = metrics if isinstance(metrics, MetricRecord) else MetricRecord.from_dict(metrics)
+        record_fields = record.to_feishu_fields(advertiser_name, ts_start, ts_end)
 
         try:
-            resp = requests.post(url, headers=headers, json=payload)
-            res_json = resp.json()
+            res_json = self._create_record(target_conf['app_token'], target_conf['table_id'], record_fields)
 
             if res_json.get("code") == 0:
                 print("✅ 飞书同步成功！")
+                return True
             else:
                 msg = res_json.get('msg', '')
                 print(f"❌ 写入失败: {msg}")
@@ -313,13 +423,14 @@ class FeishuSync:
                     if retry_count < 1:
                         print("♻️ 检测到配置过期或表格异常，正在自动创建新表并重试...")
                         self._update_local_config(advertiser_id, advertiser_name, "")
-                        self.sync_to_feishu(metrics, advertiser_id, advertiser_name, start_date, end_date,
-                                            retry_count=1)
+                        return self.sync_to_feishu(metrics, advertiser_id, advertiser_name, start_date, end_date,
+                                                   retry_count=1)
                     else:
                         print("🔴 重试后依然失败，请检查飞书后台权限。")
 
         except Exception as e:
             print(f"❌ 网络异常: {e}")
+        return False
 
 
 feishu_client = FeishuSync()
\ No newline at end of file
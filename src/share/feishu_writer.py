@@ -0,0 +1,130 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.share.feishu_sync import feishu_client, FeishuSync
+from src.utils.rate_limit import RateLimiter
+
+# ========================================================
+# 飞书分库并行写入
+# 逻辑：account_mapping 可以把不同账户指向不同的多维表格 (app_token)。
+#      待写入记录先按 多维表格 -> 数据表 分片，每个多维表格由一个独立的写入线程负责，
+#      拥有各自的调用额度；同一多维表格内按数据表依次写入，同一数据表内保持记录原有顺序。
+#      账户分布在越多的多维表格中，整体同步吞吐越高。
+#      每张数据表先整表查重一次，再用 batch_create 批量写入，代替逐条 查重 + 写入。
+# ========================================================
+
+# 每个多维表格的调用频率上限 (次/秒)
+FEISHU_BASE_RATE = 5.0
+# batch_create 单次写入条数上限 (飞书接口限制)
+BATCH_SIZE = 500
+# 同时写入的多维表格数量上限
+MAX_WRITERS = 16
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class FeishuWriterPool:
+    """按多维表格分片的并行写入器：write(records) 返回成功 (含已存在) 条数"""
+
+    def __init__(self, client: FeishuSync = feishu_client, rate: float = FEISHU_BASE_RATE,
+                 max_writers: int = MAX_WRITERS):
+        self.client = client
+        self.rate = rate
+        self.max_writers = max_writers
+
+    def shard(self, records: list) -> dict:
+        """{app_token: {账户ID: [记录, ...]}}，两层均保持记录首次出现的顺序"""
+        shards = {}
+        for r in records:
+            app_token = self.client.target_base(r.advertiser_id)
+            shards.setdefault(app_token, {}).setdefault(r.advertiser_id, []).append(r)
+        return shards
+
+    def _fallback(self, limiter: RateLimiter, records: list) -> int:
+        """批量写入失败时逐条走 sync_to_feishu (含查重与表格自动修复)，每条同样占用本多维表格的调用额度"""
+        ok = 0
+        for r in records:
+            limiter.acquire()
+            if self.client.sync_to_feishu(r, r.advertiser_id, r.advertiser_name, r.start_date, r.end_date):
+                ok += 1
+        return ok
+
+    def _write_table(self, limiter: RateLimiter, app_token: str, table_id: str, records: list) -> int:
+        client = self.client
+        try:
+            existing = client.list_periods(app_token, table_id, before_page=limiter.acquire)
+        except Exception as e:
+            print(f"⚠️ 读取数据表 {table_id} 失败，改为逐条同步: {e}")
+            return self._fallback(limiter, records)
+
+        ok = 0
+        pending = []
+        for r in records:
+            start_ts, end_ts = client.date_to_timestamp(r.start_date), client.date_to_timestamp(r.end_date)
+            # 同一数据表可能写入多个账户，查重键需包含账户名称
+            key = (r.advertiser_name, start_ts, end_ts)
+            if key in existing:
+                ok += 1
+                continue
+            existing.add(key)
+            pending.append((r, r.to_feishu_fields(r.advertiser_name, start_ts, end_ts)))
+
+        for i, chunk in enumerate(_chunks(pending, BATCH_SIZE)):
+            limiter.acquire()
+            try:
+                res = client.batch_create_records(app_token, table_id, [fields for _, fields in chunk])
+            except Exception as e:
+                res = {"msg": str(e)}
+            if res.get("code") == 0:
+                ok += len(chunk)
+                continue
+            # 剩余记录 (含本批) 按原顺序逐条重试，保证同一数据表内的写入顺序
+            print(f"⚠️ 数据表 {table_id} 批量写入失败 ({res.get('msg')})，剩余记录改为逐条同步")
+            rest = [r for r, _ in pending[i * BATCH_SIZE:]]
+            return ok + self._fallback(limiter, rest)
+        return ok
+
+    def _write_base(self, app_token: str, accounts: dict) -> int:
+        """单个多维表格的写入线程：解析各账户的数据表后依次写入"""
+        limiter = RateLimiter(self.rate)
+        tables = {}
+        for adv_id, records in accounts.items():
+            target = self.client.mapped_target(adv_id)
+            if not target:
+                # 未配置数据表的账户需要云端查找或新建，占用本多维表格的调用额度
+                limiter.acquire()
+                target = self.client.resolve_target(adv_id, records[0].advertiser_name)
+            if not target:
+                print(f"❌ [{records[0].advertiser_name}] 无法确定飞书数据表，跳过 {len(records)} 条")
+                continue
+            tables.setdefault(target["table_id"], []).extend(records)
+
+        return sum(self._write_table(limiter, app_token, table_id, records)
+                   for table_id, records in tables.items())
+
+    def write(self, records: list) -> int:
+        if not records:
+            return 0
+        shards = self.shard(records)
+        if shards.pop(None, None):
+            print("❌ 缺少 default_app_token，未配置数据表的账户无法同步")
+
+        started = time.monotonic()
+        ok = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_writers, len(shards)))) as pool:
+            futures = {pool.submit(self._write_base, app_token, accounts): app_token
+                       for app_token, accounts in shards.items()}
+            for fut in as_completed(futures):
+                try:
+                    ok += fut.result()
+                except Exception as e:
+                    print(f"❌ 多维表格 {futures[fut]} 写入异常: {e}")
+        print(f"📤 {len(shards)} 个多维表格并行写入完成，用时 {time.monotonic() - started:.1f} 秒")
+        return ok
+
+
+def write_records(records: list) -> int:
+    """并行写入一批记录到飞书，返回成功 (含已存在) 条数"""
+    return FeishuWriterPool().write(records)
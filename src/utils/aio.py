@@ -0,0 +1,80 @@
+import atexit
+import asyncio
+import threading
+import weakref
+import aiohttp
+
+# ========================================================
+# 异步运行时
+# 逻辑：进程内常驻一个后台事件循环线程，聚光 / 飞书接口的异步实现都在该循环上运行，
+#      共享同一个 aiohttp 连接池；同步函数通过 run_sync() 把协程提交到该循环并等待结果，
+#      因此多线程调用同步接口时，实际的网络请求仍汇聚在一个循环和一个连接池里。
+# ========================================================
+
+# 连接池上限：同时在途的 HTTP 连接数
+CONNECTION_LIMIT = 200
+REQUEST_TIMEOUT = 30
+
+_sessions = weakref.WeakKeyDictionary()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """获取当前事件循环对应的共享 ClientSession (每个事件循环一个连接池)"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CONNECTION_LIMIT),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def gather_limited(coros, limit: int):
+    """并发执行一批协程，同时在途数量不超过 limit；结果顺序与输入一致，异常作为结果返回"""
+    sem = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with sem:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros), return_exceptions=True)
+
+
+class _Runtime:
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="aio-runtime", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            return self._loop
+
+    def run(self, coro):
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("不能在异步运行时线程内调用同步接口，请直接 await 对应的 *_async 方法")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop()).result()
+
+    def close(self):
+        if self._loop is None or not self._loop.is_running():
+            return
+        session = _sessions.get(self._loop)
+        if session is not None and not session.closed:
+            asyncio.run_coroutine_threadsafe(session.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_runtime = _Runtime()
+
+
+def run_sync(coro):
+    """在共享事件循环上执行协程并阻塞等待结果 (供同步包装函数使用)"""
+    return _runtime.run(coro)
@@ -1,7 +1,7 @@
 import os
 import sys
-import json
 from pathlib import Path
+from src.utils.storage import read_json, write_json_atomic
 
 # ========================================================
 # 动态获取项目根目录
@@ -21,25 +21,29 @@ APP_CONFIG_PATH = BASE_DIR / 'app_config.json'
 TOKEN_CONFIG_PATH = BASE_DIR / 'token_config.json'
 DATA_DOWNLOAD_DIR = BASE_DIR / 'data_download'
 FEISHU_CONFIG_PATH = BASE_DIR / 'feishu_config.json'
+# 飞书 tenant_access_token 本地缓存 (多次运行 / 多进程共享)
+FEISHU_TOKEN_CACHE_PATH = BASE_DIR / 'feishu_token_cache.json'
+# 账户分组 (客户 / 地区 / 团队 等自定义分组)
+ACCOUNT_GROUPS_PATH = BASE_DIR / 'account_groups.json'
+
+# 本地查询守护进程监听地址 (默认仅本机可访问，可通过环境变量调整)
+DAEMON_HOST = os.environ.get('REDAD_DAEMON_HOST', '127.0.0.1')
+DAEMON_PORT = int(os.environ.get('REDAD_DAEMON_PORT', '8765'))
+# 守护进程访问口令 (可选)：设置后客户端须携带相同口令才能调用
+DAEMON_KEY = os.environ.get('REDAD_DAEMON_KEY', '')
 
 # 确保存储目录存在
 DATA_DOWNLOAD_DIR.mkdir(exist_ok=True)
 
 def load_json(path: Path) -> dict | list:
     """通用 JSON 读取器，处理文件不存在或格式错误的情况"""
-    if not path.exists():
-        # token_config 默认为空列表，其他默认为空字典
-        return [] if 'token_config' in str(path) else {}
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return [] if 'token_config' in str(path) else {}
-
-def save_json(path: Path, data: dict | list) -> None:
-    """通用 JSON 写入器，支持中文编码"""
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    # token_config 默认为空列表，其他默认为空字典
+    default = [] if 'token_config' in str(path) else {}
+    return read_json(path, default)
+
+def save_json(path: Path, data: dict | list, compact: bool = False) -> None:
+    """通用 JSON 写入器，支持中文编码；原子写入，并发读取不会读到半截文件"""
+    write_json_atomic(path, data, compact=compact)
 
 def load_app_config() -> dict:
     """加载聚光平台应用配置 (App ID / Secret)"""
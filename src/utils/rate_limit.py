@@ -0,0 +1,37 @@
+import time
+import threading
+
+# 聚光接口调用频率上限 (次/秒)，批量查询 / 回填等并发任务默认使用
+SPOTLIGHT_RATE = 5.0
+
+
+class RateLimiter:
+    """
+    令牌桶限流器：多线程共享同一份调用额度。
+    rate 为每秒允许的请求数，burst 为允许的瞬时突发量。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,192 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from src.utils.rate_limit import RateLimiter, SPOTLIGHT_RATE
+
+# ========================================================
+# 聚光接口调用调度器
+# 逻辑：进程内所有聚光调用共享一份频率额度，按优先级排队：
+#      交互查询 > 每日定时拉取 > 历史回填。
+#      每拿到一个调用令牌才从队列中挑选任务，因此后到的高优先级请求可以直接插到积压任务之前；
+#      同一优先级内按账户轮转，避免单个大账户占满额度。
+#      本地查询服务运行时，各窗口的查询都汇聚到服务进程，由服务端的调度器统一排队。
+# ========================================================
+
+INTERACTIVE = 0
+DAILY = 1
+BACKFILL = 2
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    DAILY: "daily",
+    BACKFILL: "backfill",
+}
+
+# 同时执行的调用数上限
+DEFAULT_CONCURRENCY = 8
+# 每个优先级保留最近多少次排队耗时用于统计
+WAIT_SAMPLES = 1000
+
+
+class _Job:
+    __slots__ = ("priority", "account", "fn", "args", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, priority: int, account, fn, args, kwargs):
+        self.priority = priority
+        self.account = account
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+def _admit():
+    """admit_async 的占位任务：被调度执行即表示获得调用许可"""
+    return None
+
+
+class JobScheduler:
+    """
+    优先级 + 账户公平的任务调度器。
+    submit() 立即返回 Future；call() 阻塞等待结果，供同步代码直接替换原有调用。
+    """
+
+    def __init__(self, rate: float = SPOTLIGHT_RATE, concurrency: int = DEFAULT_CONCURRENCY):
+        self.limiter = RateLimiter(rate)
+        self.concurrency = max(1, int(concurrency))
+        self._cond = threading.Condition()
+        # {优先级: {账户: deque[_Job]}}，OrderedDict 的顺序即账户轮转顺序
+        self._queues = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self._queued = {p: 0 for p in PRIORITY_NAMES}
+        self._running = {p: 0 for p in PRIORITY_NAMES}
+        self._submitted = {p: 0 for p in PRIORITY_NAMES}
+        self._completed = {p: 0 for p in PRIORITY_NAMES}
+        # 由低优先级提升到该优先级的任务数 (submitted 仍按最初提交的优先级统计)
+        self._promoted = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        # 排队中的任务 {Future: _Job}，供 promote() 定位
+        self._pending = {}
+        # 同一时刻只有一个调度线程在等待令牌并挑选任务，拿到的令牌一定有任务可用
+        self._dispatch = threading.Lock()
+        self._workers = []
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, fn, *args, priority: int = INTERACTIVE, account=None, **kwargs) -> Future:
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"未知的优先级: {priority}")
+        job = _Job(priority, str(account) if account is not None else "", fn, args, kwargs)
+        with self._cond:
+            self._ensure_workers()
+            self._queues[priority].setdefault(job.account, deque()).append(job)
+            self._queued[priority] += 1
+            self._submitted[priority] += 1
+            self._pending[job.future] = job
+            self._cond.notify()
+        return job.future
+
+    def call(self, fn, *args, priority: int = INTERACTIVE, account=None, **kwargs):
+        return self.submit(fn, *args, priority=priority, account=account, **kwargs).result()
+
+    async def admit_async(self, priority: int = INTERACTIVE, account=None):
+        """
+        协程版排队：按优先级 / 账户轮转等到调用许可后返回，请求本身由调用方在事件循环中发出。
+        许可发放即计为完成，不占用调度线程等待网络响应，适合单个事件循环内的大量并发请求。
+        """
+        await asyncio.wrap_future(self.submit(_admit, priority=priority, account=account))
+
+    def promote(self, future: Future, priority: int) -> bool:
+        """
+        把仍在排队的任务提升到更高的优先级 (数值更小)，用于高优先级请求合并到已排队的低优先级请求上。
+        任务已开始执行或优先级已不低于 priority 时不做处理。
+        """
+        with self._cond:
+            job = self._pending.get(future)
+            if job is None or job.priority <= priority:
+                return False
+            jobs = self._queues[job.priority][job.account]
+            jobs.remove(job)
+            if not jobs:
+                del self._queues[job.priority][job.account]
+            self._queued[job.priority] -= 1
+
+            job.priority = priority
+            self._queues[priority].setdefault(job.account, deque()).append(job)
+            self._queued[priority] += 1
+            self._promoted[priority] += 1
+            return True
+
+    def _pop_next(self):
+        """取最高优先级中轮到的账户的下一个任务 (需持有 _cond)"""
+        for p in PRIORITY_NAMES:
+            accounts = self._queues[p]
+            if not accounts:
+                continue
+            account, jobs = next(iter(accounts.items()))
+            job = jobs.popleft()
+            if jobs:
+                # 该账户还有任务，排到本优先级队尾，下次轮到其他账户
+                accounts.move_to_end(account)
+            else:
+                del accounts[account]
+            self._queued[p] -= 1
+            self._pending.pop(job.future, None)
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._dispatch:
+                with self._cond:
+                    while not any(self._queued.values()):
+                        self._cond.wait()
+
+                # 先拿令牌再挑任务：等待令牌期间新到的高优先级任务也能被选中。
+                # 只有持有 _dispatch 的线程会取走任务，因此拿到令牌时队列中必然仍有任务
+                self.limiter.acquire()
+                with self._cond:
+                    job = self._pop_next()
+                    self._waits[job.priority].append(time.monotonic() - job.enqueued_at)
+                    self._running[job.priority] += 1
+
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.fn(*job.args, **job.kwargs))
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[job.priority] -= 1
+                    self._completed[job.priority] += 1
+
+    def stats(self) -> dict:
+        """各优先级的排队深度、执行中数量、累计任务数与排队耗时 (秒)"""
+        result = {}
+        with self._cond:
+            for p, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[p])
+                result[name] = {
+                    "queued": self._queued[p],
+                    "running": self._running[p],
+                    "accounts": len(self._queues[p]),
+                    "submitted": self._submitted[p],
+                    "promoted": self._promoted[p],
+                    "completed": self._completed[p],
+                    "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                    "wait_max": round(waits[-1], 3) if waits else 0.0,
+                }
+        return result
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Callable
+
+# ========================================================
+# 本地存储层：原子写入 + 跨进程文件锁
+# 逻辑：写入先落到同目录临时文件，fsync 后 os.replace 覆盖目标文件，
+#      读者永远只会看到完整的旧文件或新文件；读-改-写操作通过 <文件>.lock 加锁，
+#      保证定时任务、交互会话与并发线程同时更新 Token / 配置时不会互相覆盖。
+# ========================================================
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                # LK_LOCK 内部最多重试 10 次 (约 10 秒)，超时抛出 OSError，继续等待即可
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+_registry_lock = threading.Lock()
+_thread_locks = {}
+_local = threading.local()
+
+
+def _thread_lock_for(key: str) -> threading.Lock:
+    with _registry_lock:
+        if key not in _thread_locks:
+            _thread_locks[key] = threading.Lock()
+        return _thread_locks[key]
+
+
+@contextmanager
+def file_lock(path: Path):
+    """
+    对 path 加独占锁 (进程间通过 <path>.lock 文件，进程内通过线程锁)。
+    同一线程内可重入，便于在持锁期间调用其他加锁的读写函数。
+    """
+    key = str(Path(path).resolve())
+    held = getattr(_local, 'held', None)
+    if held is None:
+        held = _local.held = {}
+
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    with _thread_lock_for(key):
+        with open(key + '.lock', 'a+b') as f:
+            _lock_file(f)
+            held[key] = 1
+            try:
+                yield
+            finally:
+                held[key] = 0
+                _unlock_file(f)
+
+
+class CorruptFileError(Exception):
+    """文件存在但内容无法解析：拒绝覆盖写入，避免丢失其中仍可人工恢复的数据"""
+    pass
+
+
+def _load_existing(path: Path) -> Any:
+    """读取 JSON；文件不存在或为空时返回 None，内容损坏时抛出 CorruptFileError"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    if not text.strip():
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise CorruptFileError(f"{Path(path).name} 内容损坏 ({e})，请修复或删除该文件后重试") from e
+
+
+def read_json(path: Path, default: Any = None) -> Any:
+    """读取 JSON，文件不存在或为空时返回 default；文件损坏时给出提示并返回 default"""
+    try:
+        data = _load_existing(Path(path))
+    except CorruptFileError as e:
+        print(f"⚠️ 已按空数据处理: {e}")
+        return default
+    except IOError:
+        return default
+    return default if data is None else data
+
+
+def write_json_atomic(path: Path, data: Any, compact: bool = False) -> None:
+    """
+    原子写入 JSON：临时文件 + fsync + os.replace。
+    compact=True 时使用紧凑编码 (无缩进、无多余空格)，适合程序内部的状态/缓存文件。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=4)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=str(path.parent))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(5):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                # Windows 下目标文件被其他进程短暂打开读取时会拒绝替换，稍后重试
+                if attempt == 4:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def update_json(path: Path, mutator: Callable[[Any], Any], default: Callable[[], Any] = dict,
+                compact: bool = False) -> Any:
+    """
+    加锁的读-改-写：读取最新内容 -> mutator 原地修改 (或返回新对象) -> 原子写回。
+    返回写回后的数据。文件存在但内容损坏时抛出 CorruptFileError，不会用默认值覆盖原文件。
+    """
+    with file_lock(path):
+        data = _load_existing(Path(path))
+        if data is None:
+            data = default()
+        result = mutator(data)
+        if result is not None:
+            data = result
+        write_json_atomic(path, data, compact=compact)
+        return data